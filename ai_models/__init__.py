@@ -1,8 +1,29 @@
 """
 AI Models package for emotion detection and dropout risk prediction
+
+The model classes are imported on first access (e.g. ``ai_models.EmotionAnalyzer``)
+so importing the package does not pull in transformers, torch or scikit-learn.
 """
 
-from .emotion_model import EmotionAnalyzer
-from .tabular_model import DropoutRiskPredictor
+import importlib
+
+_LAZY_EXPORTS = {
+    'EmotionAnalyzer': '.emotion_model',
+    'EmotionCache': '.emotion_cache',
+    'DropoutRiskPredictor': '.tabular_model',
+    'LatencyBudgetedPredictor': '.backend_policy',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-__all__ = ['EmotionAnalyzer', 'DropoutRiskPredictor']
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,188 @@
+"""
+Latency-budgeted choice between dropout model backends
+
+TabPFN re-processes its training context on every predict_proba call, so it
+is much slower on CPU than the RandomForest fallback. LatencyBudgetedPredictor
+holds one DropoutRiskPredictor per backend, benchmarks each at startup, and
+for every call picks the first backend (in preference order) whose estimated
+latency for that many rows fits the call's budget. Results carry the backend
+and model version that produced them and the measured latency of the model
+call.
+"""
+
+import logging
+import threading
+import time
+
+from .synthetic_data import generate_cohort
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Batch sizes timed by benchmark(); latency is fitted as fixed + per_row * rows
+BENCHMARK_SIZES = (1, 64)
+
+
+class LatencyBudgetedPredictor:
+    """
+    Routes predict()/predict_batch() to the preferred backend that fits a latency budget
+    """
+
+    def __init__(self, predictors, latency_budget_ms=50.0, batch_latency_budget_ms=5000.0):
+        """
+        Args:
+            predictors: DropoutRiskPredictor instances, most preferred first
+                        (e.g. TabPFN, then RandomForest)
+            latency_budget_ms: budget for single predict() calls
+            batch_latency_budget_ms: budget for one predict_batch() call
+        """
+        if not predictors:
+            raise ValueError("LatencyBudgetedPredictor needs at least one predictor")
+        self.predictors = list(predictors)
+        self.latency_budget_ms = latency_budget_ms
+        self.batch_latency_budget_ms = batch_latency_budget_ms
+        self.estimates = {}  # backend -> {'fixed_ms', 'per_row_ms'}
+        self._usage = {p.backend: {'calls': 0, 'rows': 0, 'total_ms': 0.0} for p in self.predictors}
+        self._lock = threading.Lock()
+
+    @property
+    def backends(self):
+        return [p.backend for p in self.predictors]
+
+    @property
+    def model_version(self):
+        """Version of the backend that serves single predictions"""
+        return self.choose(1, self.latency_budget_ms).model_version
+    
+    @property
+    def model_versions(self):
+        """backend -> model version of every held predictor"""
+        return {p.backend: p.model_version for p in self.predictors}
+
+    def benchmark(self, sizes=BENCHMARK_SIZES, runs=3):
+        """
+        Time every backend at a few batch sizes and fit a linear latency estimate
+
+        Args:
+            sizes: two or more batch sizes to time
+            runs: timings per size; the fastest is kept
+
+        Returns:
+            dict: backend -> {'fixed_ms', 'per_row_ms'}
+        """
+        X, _ = generate_cohort(max(sizes), seed=7)
+        small, large = min(sizes), max(sizes)
+        for predictor in self.predictors:
+            timings = {}
+            for size in (small, large):
+                best = float('inf')
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    predictor.predict_batch(X[:size])
+                    best = min(best, time.perf_counter() - started)
+                timings[size] = best * 1000
+            per_row = max((timings[large] - timings[small]) / (large - small), 0.0) if large > small else 0.0
+            self.estimates[predictor.backend] = {
+                'fixed_ms': round(max(timings[small] - per_row * small, 0.0), 3),
+                'per_row_ms': round(per_row, 4)
+            }
+        logger.info(f"Dropout backend latency estimates: {self.estimates}")
+        return dict(self.estimates)
+
+    def estimate_ms(self, backend, n_rows):
+        """Estimated latency of scoring n_rows on a backend, or None before benchmark()"""
+        estimate = self.estimates.get(backend)
+        if estimate is None:
+            return None
+        return estimate['fixed_ms'] + estimate['per_row_ms'] * n_rows
+
+    def choose(self, n_rows, budget_ms):
+        """
+        Pick the backend for a call
+
+        Returns the first predictor whose estimate fits budget_ms, else the
+        fastest one. Before benchmark() has run, the last (cheapest) predictor.
+        """
+        if not self.estimates:
+            return self.predictors[-1]
+        candidates = [p for p in self.predictors if p.backend in self.estimates]
+        for predictor in candidates:
+            if self.estimate_ms(predictor.backend, n_rows) <= budget_ms:
+                return predictor
+        return min(candidates, key=lambda p: self.estimate_ms(p.backend, n_rows))
+
+    def _record(self, backend, rows, elapsed_ms):
+        with self._lock:
+            usage = self._usage[backend]
+            usage['calls'] += 1
+            usage['rows'] += rows
+            usage['total_ms'] += elapsed_ms
+
+    def predict(self, student_data, emotion_data=None, latency_budget_ms=None):
+        """
+        DropoutRiskPredictor.predict() on the backend chosen for one row
+
+        The result also has 'backend', 'model_version' and 'latency_ms' (the
+        model call's measured latency).
+        """
+        budget = self.latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        predictor = self.choose(1, budget)
+        started = time.perf_counter()
+        result = predictor.predict(student_data, emotion_data)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record(predictor.backend, 1, elapsed_ms)
+        result['backend'] = predictor.backend
+        result['model_version'] = predictor.model_version
+        result['latency_ms'] = round(elapsed_ms, 2)
+        return result
+
+    def predict_batch(self, students, emotion_data=None, latency_budget_ms=None, **kwargs):
+        """
+        DropoutRiskPredictor.predict_batch() on the backend chosen for len(students) rows
+
+        Every result also has 'backend', 'model_version' and 'latency_ms' (the
+        latency of the whole batch call).
+        """
+        budget = self.batch_latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        predictor = self.choose(len(students), budget)
+        started = time.perf_counter()
+        results = predictor.predict_batch(students, emotion_data, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record(predictor.backend, len(students), elapsed_ms)
+        for result in results:
+            result['backend'] = predictor.backend
+            result['model_version'] = predictor.model_version
+            result['latency_ms'] = round(elapsed_ms, 2)
+        return results
+
+    def warm_up(self, runs=3):
+        """
+        Warm up every backend, then benchmark them
+
+        Returns:
+            list: warm-up predict() latencies in seconds of the backend that
+                  serves single predictions
+        """
+        latencies = {p.backend: p.warm_up(runs=runs) for p in self.predictors}
+        self.benchmark()
+        return latencies[self.choose(1, self.latency_budget_ms).backend]
+
+    def stats(self):
+        """Per-backend version, latency estimate and call counts, for /health"""
+        with self._lock:
+            usage = {backend: dict(values) for backend, values in self._usage.items()}
+        stats = {
+            'latency_budget_ms': self.latency_budget_ms,
+            'batch_latency_budget_ms': self.batch_latency_budget_ms,
+            'backends': {}
+        }
+        for predictor in self.predictors:
+            counts = usage[predictor.backend]
+            stats['backends'][predictor.backend] = {
+                'version': predictor.model_version,
+                'estimate': self.estimates.get(predictor.backend),
+                'calls': counts['calls'],
+                'rows': counts['rows'],
+                'avg_ms': round(counts['total_ms'] / counts['calls'], 2) if counts['calls'] else None
+            }
+        return stats
@@ -0,0 +1,209 @@
+"""
+Content-addressed cache for emotion analysis results
+
+Results are keyed by a hash of the normalized text and the model
+configuration that produced them, held in an in-memory LRU with optional
+TTL, and optionally backed by a SQLite table so hits survive restarts and
+are shared between gunicorn workers. The table is pruned to the TTL and a
+row limit as results are written.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Persistent writes between prunes of expired and surplus rows
+PRUNE_EVERY = 100
+
+
+def normalize_text(text):
+    """
+    Canonical form used for cache keys: NFC, trimmed, whitespace runs collapsed
+    """
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+class EmotionCache:
+    """
+    Thread-safe LRU + TTL cache of analyze() results
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=None, db_path=None, max_persistent_entries=100000):
+        """
+        Args:
+            max_entries: in-memory entries kept before least-recently-used eviction
+            ttl_seconds: entries older than this are treated as misses (None = never expire)
+            db_path: optional SQLite file for a persistent, cross-process layer
+            max_persistent_entries: rows kept in the SQLite table; the oldest
+                                    are deleted beyond this
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_persistent_entries = max_persistent_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'persistent_hits': 0, 'evictions': 0, 'pruned': 0}
+
+        self.db_path = db_path
+        self._db = None
+        # Guards the SQLite connection so its I/O never holds up in-memory lookups
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        if db_path:
+            self._open_db()
+    
+    def _open_db(self):
+        """
+        Connect to the persistent table
+
+        The table is created by the app's schema migrations (migrations.py);
+        persistence stays off if it is missing.
+        """
+        try:
+            self._db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            self._db.execute('SELECT 1 FROM emotion_cache LIMIT 1')
+        except sqlite3.Error as e:
+            logger.warning(f"Emotion cache persistence disabled ({e})")
+            self._db = None
+    
+    def after_fork(self):
+        """
+        Give a forked worker its own lock and SQLite connection
+        
+        Connections must not be shared across processes, so the copy
+        inherited from the parent is abandoned, not closed.
+        """
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        if self.db_path:
+            self._db = None
+            self._open_db()
+
+    @staticmethod
+    def make_key(text, model_id):
+        """Hash of the model configuration and normalized text"""
+        digest = hashlib.sha256()
+        digest.update(model_id.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_text(text).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _expired(self, created_at):
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """
+        Look up a result
+
+        Returns:
+            dict or None: a copy of the cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, result = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return copy.deepcopy(result)
+                del self._entries[key]
+
+        # SQLite is read outside the in-memory lock
+        row = None
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    row = self._db.execute(
+                        'SELECT result, created_at FROM emotion_cache WHERE cache_key = ?', (key,)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"Emotion cache read failed: {e}")
+
+        with self._lock:
+            if row is not None and not self._expired(row[1]):
+                result = json.loads(row[0])
+                self._remember(key, result, row[1])
+                self._stats['hits'] += 1
+                self._stats['persistent_hits'] += 1
+                return copy.deepcopy(result)
+
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, key, result):
+        """Store a result in memory and, if configured, in SQLite"""
+        created_at = time.time()
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._remember(key, result, created_at)
+
+        if self._db is not None:
+            with self._db_lock:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO emotion_cache (cache_key, result, created_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(result), created_at)
+                    )
+                    self._writes += 1
+                    if self._writes % PRUNE_EVERY == 0:
+                        self._prune()
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Emotion cache write failed: {e}")
+                    # Don't leave the shared connection inside an open transaction
+                    self._db.rollback()
+
+    def _prune(self):
+        """Delete expired rows and the oldest rows over max_persistent_entries (caller holds _db_lock)"""
+        pruned = 0
+        if self.ttl_seconds is not None:
+            pruned += self._db.execute(
+                'DELETE FROM emotion_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+            ).rowcount
+        if self.max_persistent_entries is not None:
+            surplus = self._db.execute('SELECT COUNT(*) FROM emotion_cache').fetchone()[0] - self.max_persistent_entries
+            if surplus > 0:
+                pruned += self._db.execute('''
+                    DELETE FROM emotion_cache WHERE cache_key IN (
+                        SELECT cache_key FROM emotion_cache ORDER BY created_at LIMIT ?
+                    )
+                ''', (surplus,)).rowcount
+        if pruned:
+            with self._lock:
+                self._stats['pruned'] += pruned
+
+    def _remember(self, key, result, created_at):
+        """Insert into the LRU (caller holds the lock)"""
+        self._entries[key] = (created_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def clear(self):
+        """Drop every in-memory entry and, if configured, the persistent table"""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute('DELETE FROM emotion_cache')
+                self._db.commit()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['persistent'] = self._db is not None
+        return stats
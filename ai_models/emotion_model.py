@@ -2,36 +2,204 @@
 Emotion detection model using Hugging Face Transformers
 """
 
-from transformers import pipeline
+from concurrent.futures import Future
+import numpy as np
 import logging
+import queue
+import sys
+import threading
+import time
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Journal-like inputs of different lengths used by warm_up()
+WARMUP_TEXTS = [
+    "Feeling okay today.",
+    "Finding it hard to keep up with assignments. Feeling overwhelmed and tired.",
+    "Mid-terms are approaching and I feel unprepared. I studied all weekend but the "
+    "material keeps slipping away, and I'm worried that if I fail this semester my "
+    "scholarship will be gone. My friends seem fine and I don't want to bother them, "
+    "so I mostly stay in my room. Today a lab partner thanked me for helping, which "
+    "was nice, but I still can't shake the feeling that I'm falling behind.",
+]
+
 
 class EmotionAnalyzer:
     """
     Emotion analyzer using pre-trained transformer model from Hugging Face
     """
     
-    def __init__(self, model_name="j-hartmann/emotion-english-distilroberta-base"):
+    def __init__(self, model_name="j-hartmann/emotion-english-distilroberta-base",
+                 batching=False, max_batch_size=16, max_wait_ms=5,
+                 long_text=False, window_tokens=512, window_stride=128,
+                 backend='pytorch', onnx_dir=None, cache=None, parity_check=True):
         """
         Initialize the emotion analyzer
         
         Args:
             model_name: Hugging Face model identifier
+            batching: if True, concurrent analyze() calls are gathered into
+                      micro-batches and run as one padded forward pass
+            max_batch_size: most texts per micro-batch
+            max_wait_ms: longest a request waits for others to join its batch
+            long_text: if True, texts are tokenized once and split into
+                       overlapping token windows instead of being truncated
+                       to 512 tokens; window scores are averaged by length
+            window_tokens: token budget per window (capped at the model's limit)
+            window_stride: tokens shared between consecutive windows
+            backend: 'pytorch' (default), 'int8' (dynamically quantized
+                     linear layers), 'onnx' or 'onnx-int8' (onnxruntime on
+                     a graph exported by ai_models.emotion_onnx); falls back
+                     to 'pytorch' if the requested backend cannot load
+            onnx_dir: directory of the exported ONNX model
+            cache: optional EmotionCache; repeated texts are answered from
+                   it without a forward pass
+            parity_check: with backend='int8', compare against the full
+                          precision model right after quantizing; pass False
+                          to run check_int8_parity() later instead
         """
         logger.info(f"Loading emotion model: {model_name}")
-        try:
-            self.classifier = pipeline(
-                "text-classification",
-                model=model_name,
-                top_k=None  # Return all emotion scores
+        self.model_name = model_name
+        self.max_batch_size = max_batch_size
+        self.long_text = long_text
+        self.window_tokens = window_tokens
+        self.window_stride = window_stride
+        self._batcher = None
+        self.backend = 'pytorch'
+        self.cache = cache
+        
+        if backend in ('onnx', 'onnx-int8'):
+            try:
+                from .emotion_onnx import DEFAULT_ONNX_DIR, OnnxTextClassifier, log_recorded_parity
+                self.classifier = OnnxTextClassifier(
+                    onnx_dir or DEFAULT_ONNX_DIR, quantized=(backend == 'onnx-int8')
+                )
+                self.backend = backend
+                logger.info(f"Emotion model loaded with {backend} backend")
+                log_recorded_parity(onnx_dir or DEFAULT_ONNX_DIR, backend)
+            except Exception as e:
+                logger.warning(f"Could not load {backend} emotion backend ({e}), falling back to PyTorch")
+        
+        if self.backend == 'pytorch':
+            try:
+                # Imported here so loading the package stays cheap until a model is built
+                from transformers import pipeline
+                self.classifier = pipeline(
+                    "text-classification",
+                    model=model_name,
+                    top_k=None  # Return all emotion scores
+                )
+                logger.info("Emotion model loaded successfully")
+            except Exception as e:
+                logger.error(f"Error loading emotion model: {e}")
+                raise
+            
+            if backend == 'int8':
+                try:
+                    import copy
+                    import torch
+                    from torch.ao.quantization import quantize_dynamic
+                    from .emotion_onnx import check_parity, log_parity
+                    # Keeps the full-precision model for the parity check only
+                    reference = copy.copy(self.classifier) if parity_check else None
+                    self.classifier.model = quantize_dynamic(
+                        self.classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+                    )
+                    self.backend = 'int8'
+                    logger.info("Emotion model linear layers quantized to int8")
+                except Exception as e:
+                    logger.warning(f"Could not quantize emotion model ({e}), using full precision")
+                else:
+                    if reference is not None:
+                        try:
+                            log_parity('int8', check_parity(reference, self.classifier))
+                        except Exception as e:
+                            logger.warning(f"Could not run int8 emotion parity check: {e}")
+                        del reference
+        
+        # Texts longer than this are truncated by the tokenizer (outside long_text mode)
+        self.max_length = min(getattr(self.classifier.tokenizer, 'model_max_length', 512), 512)
+        
+        # Everything that changes the output for a given text
+        mode = f"long:{window_tokens}:{window_stride}" if long_text else f"tokens:{self.max_length}"
+        self.model_id = f"{model_name}|{self.backend}|{mode}"
+        
+        if batching:
+            self._batcher = MicroBatcher(self._analyze_uncached, max_batch_size, max_wait_ms)
+            logger.info(f"Emotion micro-batching enabled (batch={max_batch_size}, wait={max_wait_ms}ms)")
+    
+    def check_int8_parity(self):
+        """
+        Log how many top-1 labels of the int8 model match a freshly loaded
+        full-precision model on the reference corpus
+        
+        For analyzers built with parity_check=False, e.g. in a gunicorn
+        master that should not run inference before forking. Does nothing
+        for other backends; the reference model is released afterwards.
+        """
+        if self.backend != 'int8':
+            return
+        from transformers import pipeline
+        from .emotion_onnx import check_parity, log_parity
+        reference = pipeline("text-classification", model=self.model_name, top_k=None)
+        log_parity('int8', check_parity(reference, self.classifier))
+    
+    def warm_up(self, runs=3, texts=WARMUP_TEXTS):
+        """
+        Run representative inferences so real requests skip first-call costs
+        
+        Bypasses the cache and micro-batcher so every call reaches the model,
+        and finishes with one padded batch to warm the batched path too.
+        
+        Args:
+            runs: passes over texts
+            texts: sample inputs, ideally spanning typical lengths
+            
+        Returns:
+            list: latency in seconds of each single-text call
+        """
+        latencies = []
+        for _ in range(runs):
+            for text in texts:
+                started = time.perf_counter()
+                self._analyze_uncached([text])
+                latencies.append(time.perf_counter() - started)
+        self._analyze_uncached(list(texts))
+        return latencies
+    
+    def freeze(self):
+        """
+        Mark the PyTorch weights read-only before forking worker processes
+        
+        With gradients off and the model in eval mode, inference never
+        writes to the parameter storage, so pages loaded in a parent
+        process stay shared copy-on-write with its children.
+        """
+        model = getattr(self.classifier, 'model', None)
+        if model is None or not hasattr(model, 'parameters'):
+            return
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad_(False)
+    
+    def after_fork(self):
+        """
+        Recreate per-process state in a worker forked from a loaded parent
+        
+        Threads do not survive fork(), so the micro-batcher is restarted, and
+        the cache gets its own SQLite connection. onnxruntime sessions hold
+        their own thread pools, so ONNX backends reload the session here and
+        are not shared across workers.
+        """
+        if self._batcher is not None:
+            self._batcher = MicroBatcher(
+                self._analyze_uncached, self._batcher.max_batch_size, self._batcher.max_wait * 1000.0
             )
-            logger.info("Emotion model loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading emotion model: {e}")
-            raise
+        if self.cache is not None:
+            self.cache.after_fork()
+        if self.backend in ('onnx', 'onnx-int8'):
+            self.classifier.reload()
     
     def analyze(self, text):
         """
@@ -48,55 +216,229 @@ class EmotionAnalyzer:
             }
         """
         if not text or not text.strip():
-            return {
-                'emotion': 'neutral',
-                'score': 0.0,
-                'all_emotions': []
-            }
+            return self._neutral_result()
+        
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(text, self.model_id)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if self._batcher is not None:
+            result = self._batcher.submit(text).result()
+        elif self.long_text:
+            result = self.analyze_long([text])[0]
+        else:
+            result = self._analyze_one(text)
         
+        if key is not None and 'error' not in result:
+            self.cache.put(key, result)
+        return result
+    
+    def _analyze_one(self, text):
+        """
+        Run the pipeline on one non-empty text
+        """
         try:
             # Get predictions
-            results = self.classifier(text[:512])  # Limit text length to 512 tokens
+            results = self.classifier(text, truncation=True, max_length=self.max_length)
             
             if isinstance(results, list) and len(results) > 0:
-                # If top_k=None, results[0] contains list of all emotions
-                if isinstance(results[0], list):
-                    all_emotions = results[0]
-                else:
-                    all_emotions = [results[0]]
-                
-                # Sort by score
-                all_emotions = sorted(all_emotions, key=lambda x: x['score'], reverse=True)
-                
-                # Get primary emotion
-                primary = all_emotions[0]
-                
-                return {
-                    'emotion': primary['label'].lower(),
-                    'score': round(primary['score'], 4),
-                    'all_emotions': [
-                        {
-                            'emotion': e['label'].lower(),
-                            'score': round(e['score'], 4)
-                        }
-                        for e in all_emotions
-                    ]
-                }
+                return self._format_result(results[0])
             else:
-                return {
-                    'emotion': 'neutral',
-                    'score': 0.0,
-                    'all_emotions': []
-                }
+                return self._neutral_result()
                 
         except Exception as e:
             logger.error(f"Error analyzing emotion: {e}")
-            return {
-                'emotion': 'error',
-                'score': 0.0,
-                'all_emotions': [],
-                'error': str(e)
-            }
+            return self._error_result(e)
+    
+    def analyze_batch(self, texts, batch_size=None):
+        """
+        Analyze emotion for many texts with padded batched forward passes
+        
+        Args:
+            texts: list of input texts
+            batch_size: texts per forward pass (defaults to max_batch_size)
+            
+        Returns:
+            list: one result dict per text, in input order, same shape as analyze()
+        """
+        results = [None] * len(texts)
+        pending = []
+        keys = {}
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = self._neutral_result()
+                continue
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(text, self.model_id)
+                cached = self.cache.get(keys[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            pending.append(i)
+        
+        if not pending:
+            return results
+        
+        computed = self._analyze_uncached([texts[i] for i in pending], batch_size)
+        for i, result in zip(pending, computed):
+            results[i] = result
+            if i in keys and 'error' not in result:
+                self.cache.put(keys[i], result)
+        
+        return results
+    
+    def _analyze_uncached(self, texts, batch_size=None):
+        """
+        Run the model on a list of non-empty texts, bypassing the cache
+        """
+        if self.long_text:
+            return self.analyze_long(texts)
+        
+        try:
+            outputs = self.classifier(
+                list(texts),
+                batch_size=batch_size or self.max_batch_size,
+                truncation=True,
+                max_length=self.max_length
+            )
+            return [self._format_result(output) for output in outputs]
+        except Exception as e:
+            if len(texts) == 1:
+                logger.error(f"Error analyzing emotion: {e}")
+                return [self._error_result(e)]
+            # Score items one at a time so one bad text only fails itself
+            logger.error(f"Error analyzing emotion batch ({e}), retrying texts one at a time")
+            return [self._analyze_one(text) for text in texts]
+    
+    def analyze_long(self, texts):
+        """
+        Analyze texts of any length using overlapping token windows
+        
+        Every text is tokenized once into windows of window_tokens with
+        window_stride tokens of overlap, all windows run through the model
+        together, and each text's window probabilities are averaged weighted
+        by window length.
+        
+        Args:
+            texts: list of non-empty input texts
+            
+        Returns:
+            list: one result dict per text, same shape as analyze()
+        """
+        try:
+            tokenizer = self.classifier.tokenizer
+            max_length = min(self.window_tokens, tokenizer.model_max_length)
+            stride = min(self.window_stride, max_length // 2)
+            
+            encoded = tokenizer(
+                list(texts),
+                truncation=True,
+                max_length=max_length,
+                stride=stride,
+                return_overflowing_tokens=True,
+                padding=True,
+                return_tensors='np'
+            )
+            window_owner = encoded.pop('overflow_to_sample_mapping')
+            inputs = dict(encoded)
+            
+            # All windows in as few forward passes as the batch size allows
+            batch_size = max(self.max_batch_size, 1)
+            probabilities = np.concatenate([
+                self._window_probabilities({k: v[start:start + batch_size] for k, v in inputs.items()})
+                for start in range(0, len(window_owner), batch_size)
+            ])
+            
+            # Length-weighted mean of window probabilities per text
+            lengths = inputs['attention_mask'].sum(axis=1).astype(float)
+            totals = np.zeros((len(texts), probabilities.shape[1]))
+            np.add.at(totals, window_owner, probabilities * lengths[:, None])
+            weights = np.bincount(window_owner, weights=lengths, minlength=len(texts))
+            averaged = totals / weights[:, None]
+            
+            id2label = self._id2label()
+            return [
+                self._format_result([
+                    {'label': id2label[j], 'score': float(row[j])}
+                    for j in range(len(row))
+                ])
+                for row in averaged
+            ]
+        
+        except Exception as e:
+            logger.error(f"Error analyzing long text: {e}")
+            return [self._error_result(e) for _ in texts]
+    
+    def _window_probabilities(self, inputs):
+        """
+        Class probabilities for a batch of tokenized windows (numpy in, numpy out)
+        """
+        if hasattr(self.classifier, 'probabilities'):
+            return self.classifier.probabilities(inputs)
+        
+        import torch
+        model = self.classifier.model
+        tensors = {k: torch.from_numpy(v).to(model.device) for k, v in inputs.items()}
+        with torch.inference_mode():
+            logits = model(**tensors).logits.float()
+        return torch.softmax(logits, dim=-1).cpu().numpy().astype(np.float64)
+    
+    def _id2label(self):
+        if hasattr(self.classifier, 'id2label'):
+            return self.classifier.id2label
+        return self.classifier.model.config.id2label
+    
+    @staticmethod
+    def _format_result(output):
+        """
+        Turn the pipeline output for one text into the analyze() result dict
+        """
+        # If top_k=None, each text yields a list of all emotions
+        if isinstance(output, list):
+            all_emotions = output
+        else:
+            all_emotions = [output]
+        
+        if not all_emotions:
+            return EmotionAnalyzer._neutral_result()
+        
+        # Sort by score
+        all_emotions = sorted(all_emotions, key=lambda x: x['score'], reverse=True)
+        
+        # Get primary emotion
+        primary = all_emotions[0]
+        
+        return {
+            'emotion': primary['label'].lower(),
+            'score': round(primary['score'], 4),
+            'all_emotions': [
+                {
+                    'emotion': e['label'].lower(),
+                    'score': round(e['score'], 4)
+                }
+                for e in all_emotions
+            ]
+        }
+    
+    @staticmethod
+    def _neutral_result():
+        return {
+            'emotion': 'neutral',
+            'score': 0.0,
+            'all_emotions': []
+        }
+    
+    @staticmethod
+    def _error_result(error):
+        return {
+            'emotion': 'error',
+            'score': 0.0,
+            'all_emotions': [],
+            'error': str(error)
+        }
     
     def get_mood_score(self, emotion_data):
         """
@@ -134,3 +476,76 @@ class EmotionAnalyzer:
             base_score = base_score * confidence + 5.0 * (1 - confidence)
         
         return round(base_score, 2)
+
+
+def _native_thread_class():
+    """
+    threading.Thread, or the unpatched OS thread class under gevent
+
+    Under gevent's monkey-patching threading.Thread starts a greenlet, which
+    would run batch_fn on the event loop and cannot be started from the
+    native threads that model calls are offloaded to.
+    """
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return monkey.get_original('threading', 'Thread')
+    return threading.Thread
+
+
+class MicroBatcher:
+    """
+    Gathers single-item requests from many threads into small batches
+    
+    A background thread takes the first waiting request, then keeps
+    collecting until max_batch_size items are queued or max_wait_ms has
+    passed, and runs them through batch_fn in one call. Each caller gets
+    its own result back through a Future.
+    """
+    
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5):
+        """
+        Args:
+            batch_fn: callable taking a list of items and returning a list
+                      of results in the same order
+            max_batch_size: most items per batch_fn call
+            max_wait_ms: longest the first item in a batch waits for others
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = _native_thread_class()(target=self._run, daemon=True)
+        self._worker.start()
+    
+    def submit(self, item):
+        """
+        Queue one item for the next batch
+        
+        Returns:
+            Future: resolves to the item's result
+        """
+        future = Future()
+        self._queue.put((item, future))
+        return future
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
@@ -0,0 +1,275 @@
+"""
+ONNX Runtime backend for the emotion model
+
+Exports the Hugging Face emotion classifier to an ONNX graph (optionally
+with dynamic int8 quantization) and runs it with onnxruntime on CPU, which
+uses far less memory per worker than the full PyTorch pipeline.
+
+Export and check parity against the PyTorch pipeline:
+    python -m ai_models.emotion_onnx --quantize
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
+DEFAULT_ONNX_DIR = os.path.join(os.path.dirname(__file__), 'artifacts', 'emotion-onnx')
+ONNX_FILE = 'model.onnx'
+ONNX_INT8_FILE = 'model.int8.onnx'
+# Parity results written by the export/check command, logged when a graph loads
+PARITY_FILE = 'parity.json'
+
+# Representative journal-style sentences for the top-1 parity check
+REFERENCE_CORPUS = [
+    "I'm feeling really happy and excited about my classes today!",
+    "Finding it hard to keep up with assignments. Feeling overwhelmed.",
+    "Mid-terms are approaching and I feel unprepared.",
+    "Had a productive week. Completed all labs on time.",
+    "Working on a new machine learning project. Feeling motivated!",
+    "I failed my exam and I don't know how to tell my parents.",
+    "My roommate keeps ignoring me and it makes me so angry.",
+    "I can't sleep because I'm worried about the fee deadline.",
+    "Nothing special happened today, just went to lectures.",
+    "I got selected for the internship, I can't believe it!",
+    "I miss home a lot and feel lonely in the hostel.",
+    "The professor was rude to me in front of the whole class.",
+    "I'm scared I won't be able to finish this semester.",
+    "Spent the evening with friends and laughed a lot.",
+    "The lab report was disgusting to write, the data made no sense.",
+    "I was surprised to see my grade go up this time.",
+    "Everything feels pointless lately and I have no energy.",
+    "I finally understood recursion and it feels great.",
+    "I'm nervous about the presentation tomorrow.",
+    "Today was okay, nothing to complain about.",
+]
+
+
+def _softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class OnnxTextClassifier:
+    """
+    Pipeline-compatible text classifier backed by an onnxruntime session
+
+    Called like a top_k=None transformers pipeline: returns, per text, a
+    list of {'label', 'score'} dicts for every emotion.
+    """
+
+    def __init__(self, model_dir=DEFAULT_ONNX_DIR, quantized=False):
+        """
+        Args:
+            model_dir: directory written by export_onnx()
+            quantized: load the int8 graph instead of the float graph
+        """
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.model_path = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"No ONNX model at {self.model_path}; run python -m ai_models.emotion_onnx first"
+            )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.id2label = AutoConfig.from_pretrained(model_dir).id2label
+        self.max_length = min(self.tokenizer.model_max_length, 512)
+        self.reload()
+
+    def reload(self):
+        """(Re)create the onnxruntime session, e.g. in a freshly forked process"""
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def probabilities(self, inputs):
+        """
+        Class probabilities for already-tokenized inputs
+
+        Args:
+            inputs: dict of (N, T) integer arrays from the tokenizer
+
+        Returns:
+            np.array: (N, num_labels) probabilities
+        """
+        feed = {
+            name: np.asarray(value, dtype=np.int64)
+            for name, value in inputs.items()
+            if name in self._input_names
+        }
+        logits = self.session.run(['logits'], feed)[0]
+        return _softmax(logits.astype(np.float64))
+
+    def __call__(self, texts, batch_size=None, **kwargs):
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+        batch_size = batch_size or len(texts) or 1
+
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size],
+                truncation=True,
+                max_length=self.max_length,
+                padding=True,
+                return_tensors='np'
+            )
+            for row in self.probabilities(dict(encoded)):
+                outputs.append([
+                    {'label': self.id2label[j], 'score': float(row[j])}
+                    for j in range(len(row))
+                ])
+
+        return outputs
+
+
+def export_onnx(model_name=DEFAULT_MODEL_NAME, output_dir=DEFAULT_ONNX_DIR, quantize=False):
+    """
+    Export the emotion classifier to ONNX with dynamic batch and sequence axes
+
+    Args:
+        model_name: Hugging Face model identifier or local directory
+        output_dir: where the graph, tokenizer and config are written
+        quantize: also write a dynamically int8-quantized graph
+
+    Returns:
+        str: path of the exported float graph
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["Exporting the emotion model."], return_tensors='pt')
+    input_names = [name for name in tokenizer.model_input_names if name in sample]
+
+    class _LogitsOnly(torch.nn.Module):
+        """Positional-input wrapper so the graph inputs follow the tokenizer's names"""
+
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, *tensors):
+            return self.wrapped(**dict(zip(input_names, tensors))).logits
+
+    model_path = os.path.join(output_dir, ONNX_FILE)
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    logger.info(f"Exported ONNX emotion model to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(output_dir, ONNX_INT8_FILE)
+        quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8-quantized ONNX emotion model to {int8_path}")
+
+    return model_path
+
+
+def check_parity(reference, candidate, corpus=REFERENCE_CORPUS):
+    """
+    Compare top-1 labels of two pipeline-style classifiers on a corpus
+
+    Returns:
+        list: (text, reference_label, candidate_label) for every disagreement
+    """
+    def top1(outputs):
+        return [max(scores, key=lambda s: s['score'])['label'].lower() for scores in outputs]
+
+    expected = top1(reference(list(corpus), truncation=True))
+    actual = top1(candidate(list(corpus)))
+    return [
+        (text, want, got)
+        for text, want, got in zip(corpus, expected, actual)
+        if want != got
+    ]
+
+
+def log_parity(name, mismatches, total=len(REFERENCE_CORPUS)):
+    """Log a check_parity() result: info when every label matches, a warning otherwise"""
+    if not mismatches:
+        logger.info(f"{name} emotion backend: {total}/{total} top-1 labels match the reference")
+        return
+    logger.warning(
+        f"{name} emotion backend: {total - len(mismatches)}/{total} top-1 labels match the reference; "
+        + '; '.join(f"{want} -> {got}: {text}" for text, want, got in mismatches)
+    )
+
+
+def log_recorded_parity(model_dir, name):
+    """Log the parity result the export command recorded for a graph, or warn that there is none"""
+    try:
+        with open(os.path.join(model_dir, PARITY_FILE)) as f:
+            recorded = json.load(f)[name]
+    except (OSError, ValueError, KeyError):
+        logger.warning(f"No parity check recorded for the {name} emotion graph; "
+                       f"run python -m ai_models.emotion_onnx --check-only")
+        return
+    log_parity(name, [tuple(m) for m in recorded['mismatches']], recorded['total'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the emotion model to ONNX and check parity")
+    parser.add_argument('--model', default=DEFAULT_MODEL_NAME, help='Hugging Face model id or path')
+    parser.add_argument('--output', default=DEFAULT_ONNX_DIR, help='Output directory')
+    parser.add_argument('--quantize', action='store_true', help='Also write an int8 graph')
+    parser.add_argument('--check-only', action='store_true', help='Skip export, only check parity')
+    args = parser.parse_args()
+
+    if not args.check_only:
+        export_onnx(args.model, args.output, args.quantize)
+
+    from transformers import pipeline
+    reference = pipeline("text-classification", model=args.model, top_k=None)
+
+    failed = False
+    recorded = {}
+    variants = [False, True] if args.quantize or os.path.exists(
+        os.path.join(args.output, ONNX_INT8_FILE)) else [False]
+    for quantized in variants:
+        name = 'onnx-int8' if quantized else 'onnx'
+        mismatches = check_parity(reference, OnnxTextClassifier(args.output, quantized))
+        print(f"{name}: {len(REFERENCE_CORPUS) - len(mismatches)}/{len(REFERENCE_CORPUS)} top-1 labels match")
+        for text, want, got in mismatches:
+            print(f"   {want} -> {got}: {text}")
+        failed = failed or bool(mismatches)
+        recorded[name] = {'total': len(REFERENCE_CORPUS), 'mismatches': mismatches}
+
+    with open(os.path.join(args.output, PARITY_FILE), 'w') as f:
+        json.dump(recorded, f, indent=2)
+
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
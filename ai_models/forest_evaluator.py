@@ -0,0 +1,165 @@
+"""
+Array-backed evaluator for a fitted RandomForestClassifier
+
+Flattens every tree of the forest into shared contiguous NumPy arrays
+(feature, threshold, left/right child, leaf class probabilities) and folds
+a fitted StandardScaler into the thresholds, so raw feature rows are scored
+without sklearn's per-call validation or joblib dispatch. All trees advance
+one level per step in lockstep, for one row or a whole batch.
+"""
+
+import numpy as np
+
+
+def _fold_scaler(threshold, feature, mean, scale):
+    """
+    Raw-space thresholds equivalent to sklearn's scaled float32 comparison
+
+    sklearn tests float32((x - mean) / scale) <= t. That holds exactly for
+    raw x up to some bound T, found here by starting from the boundary of
+    the float32 rounding interval mapped back through the scaler and
+    stepping a few float64 ulps until the test flips.
+    """
+    mean = mean[feature]
+    scale = scale[feature]
+
+    def holds(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Largest float32 not above t, and the midpoint to the next float32 up
+    t32 = threshold.astype(np.float32)
+    t32 = np.where(t32.astype(np.float64) > threshold, np.nextafter(t32, np.float32(-np.inf)), t32)
+    upper = np.nextafter(t32, np.float32(np.inf)).astype(np.float64)
+    bound = (t32.astype(np.float64) + upper) / 2 * scale + mean
+
+    for _ in range(64):
+        outside = ~holds(bound)
+        if not outside.any():
+            break
+        bound[outside] = np.nextafter(bound[outside], -np.inf)
+    for _ in range(64):
+        step = np.nextafter(bound, np.inf)
+        inside = holds(step)
+        if not inside.any():
+            break
+        bound[inside] = step[inside]
+    return bound
+
+
+class CompiledForest:
+    """
+    Vectorized predict_proba for a RandomForestClassifier
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, classes,
+                 float32_inputs=True):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes_ = classes
+        # sklearn casts rows to float32 before comparing; folded thresholds
+        # already account for that cast, so raw rows stay float64
+        self.float32_inputs = float32_inputs
+
+    @classmethod
+    def from_sklearn(cls, forest, scaler=None):
+        """
+        Compile a fitted forest
+
+        Args:
+            forest: fitted RandomForestClassifier
+            scaler: optional fitted StandardScaler applied before the forest;
+                    its mean and scale are folded into the split thresholds so
+                    the compiled forest takes unscaled rows
+
+        Returns:
+            CompiledForest
+        """
+        if scaler is not None:
+            n_features = forest.n_features_in_
+            mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(n_features)
+            scale = scaler.scale_ if scaler.scale_ is not None else np.ones(n_features)
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n) + offset
+
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+            threshold = tree.threshold.astype(np.float64).copy()
+            if scaler is not None:
+                # (x - mean) / scale <= t  <=>  x <= t * scale + mean  (scale > 0)
+                split = ~is_leaf
+                threshold[split] = _fold_scaler(threshold[split], feature[split], mean, scale)
+            # Leaves point at themselves, so extra steps leave finished rows in place
+            left = np.where(is_leaf, node_ids, tree.children_left + offset).astype(np.intp)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset).astype(np.intp)
+
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            value = np.divide(value, totals, out=np.zeros_like(value), where=totals > 0)
+
+            features.append(feature)
+            thresholds.append(threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(value)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            left=np.ascontiguousarray(np.concatenate(lefts)),
+            right=np.ascontiguousarray(np.concatenate(rights)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(forest.classes_),
+            float32_inputs=scaler is None
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict_proba(self, X):
+        """
+        Class probabilities, the mean of the trees' leaf distributions
+
+        Args:
+            X: (N, n_features) raw feature rows, or one (n_features,) row
+
+        Returns:
+            np.array: (N, n_classes) probabilities, columns ordered as classes_
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.float32_inputs:
+            X = X.astype(np.float32).astype(np.float64)
+
+        if X.shape[0] == 1:
+            # One row: walk all trees as a flat vector of node ids
+            x = X[0]
+            nodes = self.roots
+            for _ in range(self.max_depth):
+                go_left = x[self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            return self.value[nodes].mean(axis=0, keepdims=True)
+
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return self.value[nodes].mean(axis=1)
@@ -0,0 +1,170 @@
+"""
+Versioned on-disk artifacts for the dropout risk model
+
+An artifact is a joblib file holding the fitted model and scaler, plus a
+JSON manifest next to it (<file>.json) recording the format version, the
+model version, the backend, the feature-name schema, a SHA-256 checksum of
+the joblib file and any training metrics. Files are written uncompressed
+so NumPy arrays inside can be memory-mapped on load. Artifacts are
+pickles: only load files this app produced.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT_VERSION = 1
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), 'artifacts')
+
+
+class ArtifactError(Exception):
+    """Raised when an artifact is missing, corrupt or does not match the expected schema"""
+
+
+def default_artifact_path(backend):
+    """Where the predictor keeps its artifact for a backend ('random_forest' or 'tabpfn')"""
+    return os.path.join(DEFAULT_ARTIFACT_DIR, f'dropout_{backend}.joblib')
+
+
+def manifest_path(path):
+    return path + '.json'
+
+
+def file_checksum(path):
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _replace_atomically(path, write):
+    """Write to a temp file in the target directory, then rename over path"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_artifact(path, model, scaler, feature_names, backend, model_version, metrics=None, extra=None):
+    """
+    Write a model artifact and its manifest
+
+    Args:
+        path: joblib file to write (the manifest goes to path + '.json')
+        model: fitted classifier
+        scaler: fitted StandardScaler (or None)
+        feature_names: ordered feature names the model was trained on
+        backend: 'random_forest' or 'tabpfn'
+        model_version: identifier of this trained model
+        metrics: optional dict of evaluation metrics
+        extra: optional dict of additional manifest fields
+
+    Returns:
+        dict: the manifest
+    """
+    import joblib
+    import sklearn
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    payload = {'model': model, 'scaler': scaler}
+    _replace_atomically(path, lambda tmp: joblib.dump(payload, tmp, compress=0))
+
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'model_version': model_version,
+        'backend': backend,
+        'feature_names': list(feature_names),
+        'classes': [int(c) for c in getattr(model, 'classes_', [])],
+        'sha256': file_checksum(path),
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'metrics': metrics or {}
+    }
+    if extra:
+        manifest.update(extra)
+
+    def write_manifest(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    _replace_atomically(manifest_path(path), write_manifest)
+    logger.info(f"Saved dropout model artifact {model_version} to {path}")
+    return manifest
+
+
+def read_manifest(path):
+    """Load an artifact's manifest, raising ArtifactError if it is missing or unreadable"""
+    try:
+        with open(manifest_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"No readable manifest for {path}: {e}")
+
+
+def _minor_version(version):
+    """'1.3.2' -> (1, 3); None if unparsable"""
+    try:
+        return tuple(int(part) for part in str(version).split('.')[:2])
+    except ValueError:
+        return None
+
+
+def load_artifact(path, feature_names, mmap=True):
+    """
+    Load and verify a model artifact
+
+    Args:
+        path: joblib file written by save_artifact()
+        feature_names: feature order the caller will feed the model
+        mmap: memory-map NumPy arrays instead of reading them into memory
+
+    Returns:
+        tuple: (model, scaler, manifest)
+
+    Raises:
+        ArtifactError: if the artifact is missing, its checksum does not
+                       match, it was trained on a different schema, or it
+                       was pickled by a different scikit-learn minor version
+    """
+    import joblib
+    import sklearn
+
+    manifest = read_manifest(path)
+    if manifest.get('format_version') != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format {manifest.get('format_version')}")
+    if manifest.get('feature_names') != list(feature_names):
+        raise ArtifactError(f"Artifact features {manifest.get('feature_names')} do not match {list(feature_names)}")
+    # Pickled estimators are only compatible within a scikit-learn minor
+    # version; patch releases are loaded with a warning
+    saved_version = manifest.get('sklearn_version')
+    if _minor_version(saved_version) != _minor_version(sklearn.__version__):
+        raise ArtifactError(
+            f"Artifact was saved with scikit-learn {saved_version}, running {sklearn.__version__}; "
+            f"retrain it (flask --app app train-dropout-model for trained models)"
+        )
+    if saved_version != sklearn.__version__:
+        logger.warning(f"Artifact was saved with scikit-learn {saved_version}, running {sklearn.__version__}")
+    if not os.path.exists(path):
+        raise ArtifactError(f"Artifact file {path} is missing")
+    if file_checksum(path) != manifest.get('sha256'):
+        raise ArtifactError(f"Checksum mismatch for {path}")
+
+    try:
+        payload = joblib.load(path, mmap_mode='r' if mmap else None)
+    except Exception as e:
+        raise ArtifactError(f"Could not load {path}: {e}")
+    return payload['model'], payload.get('scaler'), manifest
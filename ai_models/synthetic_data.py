@@ -0,0 +1,207 @@
+"""
+Vectorized synthetic student cohort generator
+
+Produces feature rows for the dropout risk model from three risk
+archetypes (low, moderate, high) with one np.random.Generator call per
+feature block, so millions of rows take seconds. Used to train the default
+model and to benchmark the predictor at realistic cohort sizes.
+
+Write a cohort to disk:
+    python -m ai_models.synthetic_data --rows 1000000 --format parquet --output cohort.parquet
+"""
+
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Dropout model feature order; the one definition used by DropoutRiskPredictor,
+# training.py and the app's feature_store.py
+FEATURE_NAMES = [
+    'cgpa',
+    'attendance_percentage',
+    'fee_pending',
+    'mood_score',
+    'activities_per_week',
+    'emotion_joy',
+    'emotion_sadness',
+    'emotion_anger',
+    'emotion_fear',
+    'semester'
+]
+
+# Continuous features drawn uniformly from [low, high) per archetype
+UNIFORM_FEATURES = [
+    'cgpa', 'attendance_percentage', 'mood_score', 'activities_per_week',
+    'emotion_joy', 'emotion_sadness', 'emotion_anger', 'emotion_fear'
+]
+
+# label -> uniform ranges plus the probability that fees are pending
+ARCHETYPES = {
+    2: {  # High risk
+        'cgpa': (4.0, 6.5),
+        'attendance_percentage': (50, 75),
+        'mood_score': (2, 5),
+        'activities_per_week': (0, 2),
+        'emotion_joy': (0, 0.3),
+        'emotion_sadness': (0.3, 0.8),
+        'emotion_anger': (0, 0.5),
+        'emotion_fear': (0, 0.5),
+        'fee_pending': 0.6,
+    },
+    1: {  # Moderate risk
+        'cgpa': (6.0, 7.5),
+        'attendance_percentage': (70, 85),
+        'mood_score': (4, 7),
+        'activities_per_week': (1, 4),
+        'emotion_joy': (0.2, 0.5),
+        'emotion_sadness': (0.1, 0.4),
+        'emotion_anger': (0, 0.3),
+        'emotion_fear': (0, 0.3),
+        'fee_pending': 0.3,
+    },
+    0: {  # Low risk
+        'cgpa': (7.0, 10.0),
+        'attendance_percentage': (80, 100),
+        'mood_score': (6, 10),
+        'activities_per_week': (2, 7),
+        'emotion_joy': (0.4, 0.9),
+        'emotion_sadness': (0, 0.2),
+        'emotion_anger': (0, 0.2),
+        'emotion_fear': (0, 0.2),
+        'fee_pending': 0.1,
+    },
+}
+
+# P(high) = 0.3, P(moderate) = 0.7 * 0.6, P(low) = the rest
+LABEL_PROBABILITIES = {2: 0.3, 1: 0.42, 0: 0.28}
+
+
+def _archetype_tables():
+    """Per-label arrays indexed by label: uniform lows, spans and fee probability"""
+    labels = sorted(ARCHETYPES)
+    lows = np.array([[ARCHETYPES[l][f][0] for f in UNIFORM_FEATURES] for l in labels], dtype=float)
+    highs = np.array([[ARCHETYPES[l][f][1] for f in UNIFORM_FEATURES] for l in labels], dtype=float)
+    fee = np.array([ARCHETYPES[l]['fee_pending'] for l in labels], dtype=float)
+    return lows, highs - lows, fee
+
+
+def generate_cohort(n_samples, seed=42, rng=None):
+    """
+    Generate a labelled synthetic cohort
+
+    Args:
+        n_samples: number of students
+        seed: seed for a new np.random.Generator (ignored when rng is given)
+        rng: optional np.random.Generator to draw from
+
+    Returns:
+        tuple: (X, y) with X of shape (n_samples, 10) in FEATURE_NAMES order
+               and y the risk labels (0 low, 1 moderate, 2 high)
+    """
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    lows, spans, fee = _archetype_tables()
+
+    labels = np.array(sorted(LABEL_PROBABILITIES))
+    y = rng.choice(labels, size=n_samples, p=[LABEL_PROBABILITIES[l] for l in labels])
+
+    uniform = lows[y] + spans[y] * rng.random((n_samples, len(UNIFORM_FEATURES)))
+    X = np.empty((n_samples, len(FEATURE_NAMES)), dtype=float)
+    for column, name in enumerate(UNIFORM_FEATURES):
+        X[:, FEATURE_NAMES.index(name)] = uniform[:, column]
+    X[:, FEATURE_NAMES.index('fee_pending')] = rng.random(n_samples) < fee[y]
+    X[:, FEATURE_NAMES.index('semester')] = rng.integers(1, 9, size=n_samples)
+
+    return X, y
+
+
+def iter_cohort_chunks(n_samples, chunk_size=1_000_000, seed=42):
+    """
+    Yield (X, y) chunks of a cohort too large to hold at once
+
+    All chunks come from one seeded generator, so a given (n_samples, seed,
+    chunk_size) always produces the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_samples, chunk_size):
+        yield generate_cohort(min(chunk_size, n_samples - start), rng=rng)
+
+
+def write_cohort(path, n_samples, fmt=None, seed=42, chunk_size=1_000_000):
+    """
+    Generate a cohort and write it to disk
+
+    Args:
+        path: output file (.npz, .parquet or .csv)
+        n_samples: number of students
+        fmt: 'npy', 'parquet' or 'csv' (inferred from the extension if None)
+        seed: generator seed
+        chunk_size: rows generated and written at a time (parquet/csv)
+
+    Returns:
+        str: the path written
+    """
+    if fmt is None:
+        ext = os.path.splitext(path)[1].lower()
+        fmt = {'.npz': 'npy', '.npy': 'npy', '.parquet': 'parquet', '.csv': 'csv'}.get(ext)
+        if fmt is None:
+            raise ValueError(f"Cannot infer format from {path}; pass fmt='npy', 'parquet' or 'csv'")
+
+    columns = FEATURE_NAMES + ['label']
+
+    if fmt == 'npy':
+        # One archive with X and y arrays (np.load(path) -> ['X'], ['y'])
+        X, y = generate_cohort(n_samples, seed=seed)
+        if not path.endswith('.npz'):
+            path = os.path.splitext(path)[0] + '.npz'
+        np.savez(path, X=X, y=y, feature_names=np.array(FEATURE_NAMES))
+    elif fmt == 'parquet':
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing parquet requires pyarrow (pip install pyarrow)")
+        writer = None
+        try:
+            for X, y in iter_cohort_chunks(n_samples, chunk_size, seed):
+                arrays = [pa.array(X[:, i]) for i in range(X.shape[1])] + [pa.array(y)]
+                table = pa.Table.from_arrays(arrays, names=columns)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif fmt == 'csv':
+        with open(path, 'w') as f:
+            f.write(','.join(columns) + '\n')
+            for X, y in iter_cohort_chunks(n_samples, chunk_size, seed):
+                np.savetxt(f, np.column_stack([X, y]), delimiter=',',
+                           fmt=['%.6g'] * X.shape[1] + ['%d'])
+    else:
+        raise ValueError(f"Unknown format {fmt!r}; use 'npy', 'parquet' or 'csv'")
+
+    logger.info(f"Wrote {n_samples} synthetic students to {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic student cohort")
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Number of students')
+    parser.add_argument('--seed', type=int, default=42, help='Generator seed')
+    parser.add_argument('--format', choices=['npy', 'parquet', 'csv'], help='Output format (default: from extension)')
+    parser.add_argument('--output', default='synthetic_cohort.npz', help='Output file')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    path = write_cohort(args.output, args.rows, args.format, args.seed)
+    print(f"Wrote {args.rows} rows to {path} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Offline training of the dropout model on labelled data
+
+Runs a hyperparameter grid search with stratified k-fold cross-validation
+for the RandomForest backend. Every (parameters, fold) fit is a separate
+task in a process pool, so a search over a full cohort history scales with
+the number of cores. The best parameters are refitted on all rows and
+written as a versioned artifact whose manifest records the CV metrics.
+
+The app builds the dataset from SQLite (flask --app app train-dropout-model).
+Train on a saved cohort instead:
+    python -m ai_models.training --data cohort.npz --output dropout.joblib
+"""
+
+import argparse
+import datetime
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .model_artifacts import default_artifact_path, save_artifact
+from .synthetic_data import FEATURE_NAMES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Risk classes the predictor reports: P(low), P(moderate), P(high)
+RISK_CLASSES = (0, 1, 2)
+
+# Recorded outcomes -> risk class; integer labels 0-2 are taken as is
+OUTCOME_LABELS = {
+    'retained': 0,
+    'continuing': 0,
+    'graduated': 0,
+    'at_risk': 1,
+    'probation': 1,
+    'dropped_out': 2,
+    'withdrawn': 2,
+}
+
+DEFAULT_PARAM_GRID = {
+    'n_estimators': [100, 300],
+    'max_depth': [6, 10, None],
+    'min_samples_leaf': [1, 3, 5],
+    'class_weight': [None, 'balanced'],
+}
+
+# Fixed for every candidate; n_jobs=1 because parallelism is across tasks
+BASE_PARAMS = {'min_samples_split': 5, 'n_jobs': 1}
+
+
+def outcome_label(outcome):
+    """
+    Map a recorded outcome ('dropped_out', 'retained', ... or 0-2) to a risk class
+
+    Raises:
+        ValueError: for an unknown outcome
+    """
+    if isinstance(outcome, str):
+        key = outcome.strip().lower().replace(' ', '_').replace('-', '_')
+        if key in OUTCOME_LABELS:
+            return OUTCOME_LABELS[key]
+        if key.isdigit():
+            outcome = int(key)
+    if not isinstance(outcome, str) and int(outcome) == outcome and int(outcome) in RISK_CLASSES:
+        return int(outcome)
+    raise ValueError(f"Unknown outcome {outcome!r}; use 0-2 or one of {sorted(OUTCOME_LABELS)}")
+
+
+def parameter_grid(grid):
+    """Every combination of a {name: [values]} grid, as a list of dicts"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[n] for n in names))]
+
+
+# Training data of a pool worker, set once by _init_worker instead of
+# being pickled into every task
+_worker_data = {}
+
+
+def _init_worker(X, y):
+    _worker_data['X'] = X
+    _worker_data['y'] = y
+
+
+def _fit(X, y, params, seed):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    model = RandomForestClassifier(random_state=seed, **BASE_PARAMS, **params)
+    model.fit(scaler.fit_transform(X), y)
+    return model, scaler
+
+
+def _score_fold(task):
+    """Fit one candidate on one fold's training rows and score its held-out rows"""
+    from sklearn.metrics import accuracy_score, balanced_accuracy_score, f1_score, log_loss
+
+    candidate, fold, params, train_idx, test_idx, seed = task
+    X, y = _worker_data['X'], _worker_data['y']
+    started = time.perf_counter()
+    model, scaler = _fit(X[train_idx], y[train_idx], params, seed)
+    proba = model.predict_proba(scaler.transform(X[test_idx]))
+    predicted = model.classes_[proba.argmax(axis=1)]
+    y_test = y[test_idx]
+    return candidate, fold, {
+        'log_loss': float(log_loss(y_test, proba, labels=model.classes_)),
+        'accuracy': float(accuracy_score(y_test, predicted)),
+        'balanced_accuracy': float(balanced_accuracy_score(y_test, predicted)),
+        'f1_macro': float(f1_score(y_test, predicted, average='macro')),
+        'fit_seconds': time.perf_counter() - started,
+    }
+
+
+def cross_validate_grid(X, y, param_grid=None, n_splits=5, n_jobs=None, seed=42):
+    """
+    Score every parameter combination with stratified k-fold CV in a process pool
+
+    Args:
+        X: (N, 10) feature matrix in FEATURE_NAMES order
+        y: (N,) risk classes
+        param_grid: {name: [values]} for RandomForestClassifier (DEFAULT_PARAM_GRID if None)
+        n_splits: CV folds
+        n_jobs: worker processes (defaults to the CPU count)
+        seed: seed for the fold split and the forests
+
+    Returns:
+        list: one dict per candidate with 'params' and the mean and std of
+              each metric over folds, best (lowest log loss) first
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    X = np.ascontiguousarray(X, dtype=float)
+    y = np.asarray(y, dtype=int)
+    smallest = min(int((y == c).sum()) for c in np.unique(y)) if len(y) else 0
+    if len(np.unique(y)) < 2:
+        raise ValueError("Training needs at least two outcome classes")
+    if smallest < n_splits:
+        raise ValueError(f"Smallest class has {smallest} students, fewer than {n_splits} folds")
+
+    candidates = parameter_grid(param_grid or DEFAULT_PARAM_GRID)
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=seed).split(X, y))
+    tasks = [
+        (c, f, params, train_idx, test_idx, seed)
+        for c, params in enumerate(candidates)
+        for f, (train_idx, test_idx) in enumerate(folds)
+    ]
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(tasks)))
+    logger.info(f"Cross-validating {len(candidates)} candidates x {n_splits} folds on {n_jobs} processes")
+
+    scores = [[None] * n_splits for _ in candidates]
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(X, y)) as pool:
+        for candidate, fold, metrics in pool.map(_score_fold, tasks, chunksize=max(1, len(tasks) // (n_jobs * 4))):
+            scores[candidate][fold] = metrics
+
+    results = []
+    for params, fold_scores in zip(candidates, scores):
+        summary = {'params': params}
+        for metric in ('log_loss', 'accuracy', 'balanced_accuracy', 'f1_macro'):
+            values = [s[metric] for s in fold_scores]
+            summary[metric] = round(float(np.mean(values)), 4)
+            summary[f'{metric}_std'] = round(float(np.std(values)), 4)
+        summary['fit_seconds'] = round(sum(s['fit_seconds'] for s in fold_scores), 2)
+        results.append(summary)
+    results.sort(key=lambda r: r['log_loss'])
+    return results
+
+
+def train_dropout_model(X, y, output_path=None, param_grid=None, n_splits=5, n_jobs=None,
+                        seed=42, label_source=None):
+    """
+    Search hyperparameters, refit the best on every row and save the artifact
+
+    Args:
+        X, y: labelled dataset (features in FEATURE_NAMES order, risk classes)
+        output_path: artifact file (defaults to the RandomForest default artifact)
+        param_grid, n_splits, n_jobs, seed: see cross_validate_grid()
+        label_source: where the labels came from, recorded in the manifest
+
+    Returns:
+        dict: the artifact manifest
+    """
+    started = time.perf_counter()
+    results = cross_validate_grid(X, y, param_grid, n_splits, n_jobs, seed)
+    best = results[0]
+    logger.info(f"Best parameters {best['params']}: log loss {best['log_loss']}, accuracy {best['accuracy']}")
+
+    model, scaler = _fit(np.asarray(X, dtype=float), np.asarray(y, dtype=int), best['params'], seed)
+
+    y = np.asarray(y, dtype=int)
+    version = 'trained-' + datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d-%H%M%S')
+    metrics = {key: value for key, value in best.items() if key not in ('params', 'fit_seconds')}
+    metrics.update(cv_folds=n_splits, selection_metric='log_loss')
+    return save_artifact(
+        output_path or default_artifact_path('random_forest'),
+        model, scaler, FEATURE_NAMES, 'random_forest', version,
+        metrics=metrics,
+        extra={'training': {
+            'hyperparameters': best['params'],
+            'samples': int(len(y)),
+            'class_counts': {str(c): int((y == c).sum()) for c in np.unique(y)},
+            'label_source': label_source,
+            'candidates': len(results),
+            'runner_up': results[1:4],
+            'seconds': round(time.perf_counter() - started, 2),
+        }}
+    )
+
+
+def load_dataset(path):
+    """
+    Read a labelled dataset written by synthetic_data.write_cohort or a CSV
+    with FEATURE_NAMES columns plus a 'label' or 'outcome' column
+
+    Returns:
+        tuple: (X, y)
+    """
+    if path.endswith('.npz'):
+        data = np.load(path)
+        return data['X'], data['y']
+
+    import csv
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    label_column = 'label' if rows and 'label' in rows[0] else 'outcome'
+    X = np.array([[float(row[name]) for name in FEATURE_NAMES] for row in rows], dtype=float)
+    y = np.array([outcome_label(row[label_column]) for row in rows], dtype=int)
+    return X.reshape(-1, len(FEATURE_NAMES)), y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the dropout model with parallel cross-validation")
+    parser.add_argument('--data', required=True, help='Labelled dataset (.npz or .csv)')
+    parser.add_argument('--output', default=default_artifact_path('random_forest'), help='Artifact file')
+    parser.add_argument('--folds', type=int, default=5, help='Cross-validation folds')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    args = parser.parse_args()
+
+    X, y = load_dataset(args.data)
+    manifest = train_dropout_model(X, y, args.output, n_splits=args.folds, n_jobs=args.jobs,
+                                   seed=args.seed, label_source=args.data)
+    print(f"Wrote {manifest['model_version']} to {args.output}: {manifest['metrics']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, Response, stream_with_context
+import time
+_startup_began = time.perf_counter()  # Start of the startup timing report
+
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, Response, stream_with_context, g, has_app_context
 import sqlite3
 import os
+import sys
+import gc
+import queue
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import google.generativeai as genai
 import json
 import threading
+import click
+from notification_hub import NotificationHub
+from model_offload import OffloadedModel, gevent_active
 
 load_dotenv()
 
@@ -16,6 +24,12 @@ app.secret_key = os.getenv('SECRET_KEY', 'ira_secret_key')
 db_path = '/tmp/ira.db' if os.getenv('RENDER') else 'instance/ira.db'
 app.config['DATABASE'] = db_path
 
+# SQLite connection tuning (WAL lets gunicorn workers read while another writes)
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16384))
+app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_POOL_SIZE'] = int(os.getenv('SQLITE_POOL_SIZE', 0))  # 0 disables pooling
+
 # Ensure directory exists
 db_dir = os.path.dirname(db_path)
 if db_dir:
@@ -24,19 +38,31 @@ if db_dir:
 # Initialize AI models at startup
 emotion_analyzer = None
 dropout_predictor = None
-ai_models_loading = True  # Flag to track loading status
+journal_worker = None  # Background journal emotion enrichment (started with the models)
+feature_store = None  # StudentFeatureStore, created on first server-side ML scoring
+feature_store_lock = threading.Lock()
+# student_id -> ((data version, backend, model version), expires_at, result)
+# of the last server-side dropout prediction; one entry per student
+dropout_result_cache = {}
+ai_models_preloaded = False  # Loaded once in the gunicorn master (PRELOAD_AI_MODELS)
 ai_models_enabled = not os.getenv('DISABLE_AI_MODELS', '').lower() == 'true'  # Can disable via env var
+ai_models_loading = ai_models_enabled  # Flag to track loading status
+# Per-model state reported by /ready: loading, warming_up, ready, failed or disabled.
+# Set from DISABLE_AI_MODELS here so /ready works under servers that never
+# call initialize_ai_models (flask run, WSGI servers without gunicorn.conf.py)
+_initial_model_status = 'loading' if ai_models_enabled else 'disabled'
+ai_model_status = {'emotion': _initial_model_status, 'dropout': _initial_model_status}
+warmup_latencies = {}  # model -> warm-up latency summary
+# Inference methods run on native threads under gevent workers (model_offload.py).
+# Loading stays on the event loop: transformers' imports fail on pool threads,
+# and with PRELOAD_AI_MODELS it happens in the master before any request.
+EMOTION_OFFLOAD_METHODS = ('analyze', 'analyze_batch', 'analyze_long', 'warm_up', 'check_int8_parity')
+DROPOUT_OFFLOAD_METHODS = ('predict', 'predict_batch', 'warm_up', 'benchmark')
 
-# Configure Gemini API
+# Configure Gemini API (the client library itself is imported on first chat, see get_genai())
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 if GEMINI_API_KEY and GEMINI_API_KEY != 'your_gemini_api_key_here' and GEMINI_API_KEY.strip():
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        print("Gemini API configured successfully")
-    except Exception as e:
-        print(f"Gemini API configuration failed: {e}")
-        print("Chatbot will use fallback responses.")
-        GEMINI_API_KEY = None
+    print("Gemini API key configured")
 else:
     print("Gemini API key not configured")
     print("=" * 80)
@@ -56,12 +82,140 @@ else:
     print("Chatbot will use fallback responses until API key is configured.")
     GEMINI_API_KEY = None
 
-def initialize_ai_models():
-    """Initialize AI models at application startup"""
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """
+    Import and configure google.generativeai on first use
+    
+    The import alone takes most of a second, so it is kept off the startup path.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                if gevent_active():
+                    # gRPC calls would block the whole gevent worker; the REST
+                    # transport goes through the patched sockets
+                    genai.configure(api_key=GEMINI_API_KEY, transport='rest')
+                else:
+                    genai.configure(api_key=GEMINI_API_KEY)
+                _genai = genai
+    return _genai
+
+# Seconds spent in each startup phase, reported by /health and printed once the app is serving
+startup_timings = {}
+
+def record_startup_phase(phase, started):
+    """Store the time since `started` (a perf_counter value) as a startup phase"""
+    startup_timings[phase] = round(time.perf_counter() - started, 3)
+
+def build_emotion_analyzer(parity_check=True):
+    """
+    Create an EmotionAnalyzer (and its result cache) from EMOTION_* settings
+    
+    parity_check=False leaves the int8 parity check for a later
+    check_int8_parity() call
+    """
+    from ai_models.emotion_model import EmotionAnalyzer
+    from ai_models.emotion_cache import EmotionCache
+    
+    emotion_cache = None
+    cache_size = int(os.getenv('EMOTION_CACHE_SIZE', 1024))
+    if cache_size > 0:
+        cache_ttl = os.getenv('EMOTION_CACHE_TTL')
+        emotion_cache = EmotionCache(
+            max_entries=cache_size,
+            ttl_seconds=float(cache_ttl) if cache_ttl else None,
+            # Share results across workers and restarts through the app database
+            db_path=app.config['DATABASE'] if os.getenv('EMOTION_CACHE_PERSIST', '').lower() == 'true' else None,
+            max_persistent_entries=int(os.getenv('EMOTION_CACHE_PERSIST_MAX', 100000))
+        )
+    
+    return EmotionAnalyzer(
+        batching=os.getenv('EMOTION_BATCHING', '').lower() == 'true',
+        max_batch_size=int(os.getenv('EMOTION_BATCH_SIZE', 16)),
+        max_wait_ms=float(os.getenv('EMOTION_BATCH_WAIT_MS', 5)),
+        long_text=os.getenv('EMOTION_LONG_TEXT', '').lower() == 'true',
+        window_tokens=int(os.getenv('EMOTION_WINDOW_TOKENS', 512)),
+        window_stride=int(os.getenv('EMOTION_WINDOW_STRIDE', 128)),
+        backend=os.getenv('EMOTION_BACKEND', 'pytorch'),
+        onnx_dir=os.getenv('EMOTION_ONNX_DIR'),
+        cache=emotion_cache,
+        parity_check=parity_check
+    )
+
+def start_journal_enrichment():
+    """Start the background worker that writes journal_emotions rows"""
+    global journal_worker
+    
+    if not emotion_analyzer or os.getenv('JOURNAL_ENRICHMENT', 'true').lower() == 'false':
+        return
+    
+    from journal_enrichment import JournalEmotionWorker
+    get_db().close()  # make sure the journal_emotions migration has run
+    journal_worker = JournalEmotionWorker(
+        _connect,
+        emotion_analyzer,
+        batch_size=int(os.getenv('JOURNAL_ENRICHMENT_BATCH_SIZE', 32)),
+        poll_interval=float(os.getenv('JOURNAL_ENRICHMENT_INTERVAL', 30)),
+        max_attempts=int(os.getenv('JOURNAL_ENRICHMENT_MAX_ATTEMPTS', 3))
+    )
+    journal_worker.start()
+    print("Journal emotion enrichment worker started")
+
+def build_dropout_predictor():
+    """
+    Load one dropout predictor per configured backend behind a latency budget
+    
+    DROPOUT_BACKENDS lists backends in preference order; backends that cannot
+    load (e.g. TabPFN not installed) are skipped. Single predictions and
+    batches each go to the first backend whose benchmarked latency fits
+    DROPOUT_LATENCY_BUDGET_MS / DROPOUT_BATCH_LATENCY_BUDGET_MS.
+    """
+    from ai_models.tabular_model import DropoutRiskPredictor
+    from ai_models.backend_policy import LatencyBudgetedPredictor
+    
+    compiled = os.getenv('DROPOUT_COMPILED_FOREST', 'true').lower() == 'true'
+    predictors = []
+    for backend in os.getenv('DROPOUT_BACKENDS', 'tabpfn,random_forest').split(','):
+        backend = backend.strip()
+        if not backend:
+            continue
+        try:
+            predictors.append(DropoutRiskPredictor(
+                # DROPOUT_MODEL_ARTIFACT names the RandomForest artifact
+                artifact_path=os.getenv('DROPOUT_MODEL_ARTIFACT') if backend == 'random_forest' else None,
+                compiled=compiled,
+                backend=backend
+            ))
+        except Exception as e:
+            print(f"Skipping dropout backend {backend}: {e}")
+    if not predictors:
+        raise RuntimeError('No dropout model backend could be loaded')
+    
+    return LatencyBudgetedPredictor(
+        predictors,
+        latency_budget_ms=float(os.getenv('DROPOUT_LATENCY_BUDGET_MS', 50)),
+        batch_latency_budget_ms=float(os.getenv('DROPOUT_BATCH_LATENCY_BUDGET_MS', 5000))
+    )
+
+def initialize_ai_models(start_threads=True, parity_check=True):
+    """
+    Initialize AI models at application startup
+    
+    start_threads=False skips background threads (the journal enrichment
+    worker) and warm-up, for loading in a process that is about to fork.
+    parity_check runs the int8 emotion parity check after warm-up; gunicorn
+    asks for it in one worker only.
+    """
     global emotion_analyzer, dropout_predictor, ai_models_loading
     
     if not ai_models_enabled:
         print("AI models disabled via environment variable")
+        ai_model_status.update(emotion='disabled', dropout='disabled')
         ai_models_loading = False
         return False
     
@@ -70,26 +224,46 @@ def initialize_ai_models():
         
         # Initialize emotion analyzer
         try:
-            from ai_models.emotion_model import EmotionAnalyzer
-            emotion_analyzer = EmotionAnalyzer()
+            started = time.perf_counter()
+            # int8 parity is checked after warm-up (check_emotion_parity), not while loading
+            emotion_analyzer = OffloadedModel(build_emotion_analyzer(parity_check=False), EMOTION_OFFLOAD_METHODS)
+            record_startup_phase('emotion_model_load', started)
+            ai_model_status['emotion'] = 'warming_up'
             print("Emotion analyzer loaded successfully")
         except Exception as e:
+            ai_model_status['emotion'] = 'failed'
             print(f"Could not load emotion analyzer: {e}")
             print("App will continue without emotion analysis")
         
+        if start_threads:
+            try:
+                start_journal_enrichment()
+            except Exception as e:
+                print(f"Could not start journal emotion enrichment: {e}")
+        
         # Initialize dropout risk predictor
         try:
-            from ai_models.tabular_model import DropoutRiskPredictor
-            dropout_predictor = DropoutRiskPredictor()
+            started = time.perf_counter()
+            dropout_predictor = OffloadedModel(build_dropout_predictor(), DROPOUT_OFFLOAD_METHODS)
+            record_startup_phase('dropout_model_load', started)
+            ai_model_status['dropout'] = 'warming_up'
             print("Dropout risk predictor loaded successfully")
         except Exception as e:
+            ai_model_status['dropout'] = 'failed'
             print(f"Could not load dropout predictor: {e}")
             print("App will continue without ML-based dropout prediction")
         
+        # Warm up before serving; a process about to fork warms up in each worker instead
+        if start_threads:
+            warm_up_models()
+            if parity_check:
+                check_emotion_parity()
+        
         ai_models_loading = False
         
         if emotion_analyzer or dropout_predictor:
             print("AI models initialized successfully!")
+            print(f"Startup timings (seconds): {startup_timings}")
             return True
         else:
             print("No AI models loaded, but app will function normally")
@@ -98,27 +272,229 @@ def initialize_ai_models():
     except Exception as e:
         print(f"Error initializing AI models: {e}")
         print("The application will continue with basic functionality.")
+        for model, state in ai_model_status.items():
+            if state == 'loading':
+                ai_model_status[model] = 'failed'
         ai_models_loading = False
         return False
 
-def initialize_ai_models_background():
+def _latency_summary(latencies):
+    """Nearest-rank p50/p95 of a list of latencies in seconds, in milliseconds"""
+    ordered = sorted(latencies)
+    
+    def percentile(p):
+        return round(ordered[max(0, -(-len(ordered) * p // 100) - 1)] * 1000, 2)
+    
+    return {'runs': len(ordered), 'p50_ms': percentile(50), 'p95_ms': percentile(95)}
+
+def warm_up_models():
+    """
+    Run representative inferences on every loaded model
+    
+    Pays one-time costs (graph warm-up, allocator growth) before real
+    traffic and records per-model p50/p95 latency for /ready. A model
+    counts as ready only once this has finished.
+    """
+    runs = int(os.getenv('AI_WARMUP_RUNS', 3))
+    started = time.perf_counter()
+    for name, model in (('emotion', emotion_analyzer), ('dropout', dropout_predictor)):
+        if model is None:
+            continue
+        try:
+            warmup_latencies[name] = _latency_summary(model.warm_up(runs=max(runs, 1)))
+            ai_model_status[name] = 'ready'
+        except Exception as e:
+            print(f"Warm-up of {name} model failed: {e}")
+            ai_model_status[name] = 'failed'
+    record_startup_phase('model_warm_up', started)
+    print(f"AI model warm-up finished: {warmup_latencies}")
+
+def check_emotion_parity():
+    """Log the int8 emotion model's agreement with full precision (no-op for other backends)"""
+    if emotion_analyzer is None:
+        return
+    try:
+        emotion_analyzer.check_int8_parity()
+    except Exception as e:
+        print(f"Could not run int8 emotion parity check: {e}")
+
+def initialize_ai_models_background(parity_check=True):
     """Start AI model initialization in background thread"""
-    thread = threading.Thread(target=initialize_ai_models, daemon=True)
+    thread = threading.Thread(
+        target=initialize_ai_models, kwargs={'parity_check': parity_check}, daemon=True
+    )
     thread.start()
     print("AI models loading in background (app starting immediately)...")
 
+def preload_ai_models():
+    """
+    Load the AI models in the gunicorn master before workers fork
+    
+    Called from gunicorn.conf.py when PRELOAD_AI_MODELS=true. Weights are
+    made read-only and gc.freeze() moves every loaded object out of the
+    collector's reach, so workers keep sharing the master's pages
+    copy-on-write instead of each loading its own copy.
+    """
+    global ai_models_preloaded
+    
+    # No inference in the master: the int8 parity check runs in one worker
+    initialize_ai_models(start_threads=False, parity_check=False)
+    if emotion_analyzer:
+        emotion_analyzer.freeze()
+    gc.freeze()
+    ai_models_preloaded = True
+    print(f"AI models preloaded in gunicorn master: {process_memory()}")
+
+def init_forked_worker(parity_check=False):
+    """
+    Restart per-process state in a worker forked after preload_ai_models()
+    
+    parity_check: also run the int8 emotion parity check after warm-up
+    (gunicorn.conf.py asks the first worker only)
+    """
+    if emotion_analyzer:
+        emotion_analyzer.after_fork()
+    
+    def warm_up_worker():
+        # Warm-up is per process (allocators, thread pools), so each worker runs its own
+        warm_up_models()
+        if parity_check:
+            check_emotion_parity()
+    
+    threading.Thread(target=warm_up_worker, daemon=True).start()
+    try:
+        start_journal_enrichment()
+    except Exception as e:
+        print(f"Could not start journal emotion enrichment: {e}")
+    print(f"Worker booted with preloaded AI models: {process_memory()}")
+
+def process_memory():
+    """
+    Resident memory of this process in MB
+    
+    shared_mb counts pages also mapped by other processes (such as model
+    weights inherited from the gunicorn master), private_mb the pages only
+    this process holds, and pss_mb splits shared pages evenly between the
+    processes using them, so summing pss_mb over workers gives real usage.
+    """
+    memory = {'pid': os.getpid()}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {
+                line.split(':')[0]: int(line.split()[1])
+                for line in f
+                if line.rstrip().endswith('kB')
+            }
+        memory['rss_mb'] = round(fields['Rss'] / 1024, 1)
+        memory['pss_mb'] = round(fields['Pss'] / 1024, 1)
+        memory['shared_mb'] = round((fields['Shared_Clean'] + fields['Shared_Dirty']) / 1024, 1)
+        memory['private_mb'] = round((fields['Private_Clean'] + fields['Private_Dirty']) / 1024, 1)
+    except (OSError, KeyError, ValueError):
+        # No smaps_rollup (non-Linux): peak RSS only (KB on Linux, bytes on macOS)
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory['max_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return memory
+
+class ManagedConnection(sqlite3.Connection):
+    """
+    Connection owned by the current app context.
+    close() is a no-op so helpers that open-and-close via get_db() can share
+    the request's connection; release_db() really closes or pools it.
+    """
+    managed = False
+    
+    def close(self):
+        if not self.managed:
+            super().close()
+
+# Per-worker pool of idle connections (only used when SQLITE_POOL_SIZE > 0)
+_db_pool = queue.LifoQueue()
+
+def _connect():
+    """Open a new configured connection to the database"""
+    busy_timeout = app.config['SQLITE_BUSY_TIMEOUT_MS']
+    conn = sqlite3.connect(
+        app.config['DATABASE'],
+        timeout=busy_timeout / 1000,
+        factory=ManagedConnection,
+        check_same_thread=False
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f"PRAGMA cache_size = -{int(app.config['SQLITE_CACHE_SIZE_KB'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    conn.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+    return conn
+
 def get_db():
-    """Connect to the database"""
+    """
+    Connect to the database
+    Inside an app context the same connection is returned for the whole
+    request and released in teardown; elsewhere a fresh connection is opened.
+    """
     # Ensure database exists on first access
-    global _db_initialized
     if not hasattr(get_db, '_initialized'):
         get_db._initialized = True
+        started = time.perf_counter()
         ensure_database_exists()
+        ensure_schema_current()
+        record_startup_phase('db_check', started)
     
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
+    if not has_app_context():
+        return _connect()
+    
+    conn = g.get('_database')
+    if conn is None:
+        try:
+            conn = _db_pool.get_nowait()
+        except queue.Empty:
+            conn = _connect()
+        conn.managed = True
+        g._database = conn
     return conn
 
+# Wakes open /notifications/stream connections when notifications change.
+# Under gevent workers (gunicorn.conf.py) an open stream is an idle greenlet,
+# so a worker holds hundreds; on threaded servers each stream ties up a
+# request thread and only a few are allowed. Clients over the limit poll.
+notification_hub = NotificationHub(
+    _connect,
+    poll_interval=float(os.getenv('NOTIFICATION_WATCH_INTERVAL', 2.0)),
+    max_streams=int(os.getenv('NOTIFICATION_STREAM_MAX', 900 if gevent_active() else 4))
+)
+NOTIFICATION_STREAM_SECONDS = 300   # Clients reconnect after this long
+NOTIFICATION_HEARTBEAT_SECONDS = 15  # Keep-alive comment so proxies keep the stream open
+NOTIFICATION_STREAM_RETRY_SECONDS = 60  # Retry-After for refused streams; clients back off with jitter from here
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Return the request's connection to the pool, or close it"""
+    conn = g.pop('_database', None)
+    if conn is None:
+        return
+    
+    conn.managed = False
+    try:
+        # Discard anything a failed request left uncommitted
+        conn.rollback()
+    except sqlite3.Error:
+        conn.close()
+        return
+    
+    if _db_pool.qsize() < app.config['SQLITE_POOL_SIZE']:
+        _db_pool.put(conn)
+    else:
+        conn.close()
+
+def remove_database_files():
+    """Delete the database along with its WAL and shared-memory sidecar files"""
+    for suffix in ('', '-wal', '-shm'):
+        path = app.config['DATABASE'] + suffix
+        if os.path.exists(path):
+            os.remove(path)
+
 def ensure_database_exists():
     """Ensure database exists with all tables and sample data"""
     print("=" * 80)
@@ -134,7 +510,7 @@ def ensure_database_exists():
         if os.path.exists(app.config['DATABASE']):
             # Verify tables exist
             try:
-                conn = get_db()
+                conn = _connect()
                 cursor = conn.cursor()
                 cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='students'")
                 table_exists = cursor.fetchone()
@@ -142,7 +518,7 @@ def ensure_database_exists():
                 
                 if not table_exists:
                     print("Database file exists but tables are missing! Recreating...")
-                    os.remove(app.config['DATABASE'])
+                    remove_database_files()
                 else:
                     print("Database verified - all tables exist!")
                     print("=" * 80)
@@ -153,7 +529,7 @@ def ensure_database_exists():
                 traceback.print_exc()
                 if os.path.exists(app.config['DATABASE']):
                     print("Removing corrupted database file...")
-                    os.remove(app.config['DATABASE'])
+                    remove_database_files()
         
         # Create fresh database
         print(f"Creating new database at {app.config['DATABASE']}")
@@ -170,7 +546,7 @@ def ensure_database_exists():
             # Verify it worked
             if os.path.exists(app.config['DATABASE']):
                 print(f"Database file created successfully at {app.config['DATABASE']}")
-                conn = get_db()
+                conn = _connect()
                 cursor = conn.cursor()
                 cursor.execute("SELECT COUNT(*) as count FROM students")
                 count = cursor.fetchone()['count']
@@ -302,31 +678,18 @@ def init_db():
     
     conn.commit()
     conn.close()
+    ensure_schema_current()
     print(f"Database initialized at {app.config['DATABASE']}")
 
-def calculate_risk_score(student_id):
+def _score_risk_factors(cgpa, fee_pending, avg_attendance, avg_mood):
     """
-    Calculate dropout risk score based on multiple factors
-    Returns: (risk_level, risk_score, factors)
-    risk_level: 'high', 'moderate', or 'low'
-    risk_score: 0-100
-    factors: dict of contributing factors
+    Turn a student's raw risk inputs into (risk_level, risk_score, factors)
+    Shared by the per-student and cohort scoring paths so both agree exactly
     """
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    # Get student data
-    cursor.execute('SELECT * FROM students WHERE id = ?', (student_id,))
-    student = cursor.fetchone()
-    
-    if not student:
-        return 'low', 0, {}
-    
     risk_score = 0
     factors = {}
     
     # Factor 1: CGPA (30 points)
-    cgpa = student['cgpa']
     if cgpa < 6.0:
         risk_score += 30
         factors['academics'] = 'Critical - CGPA below 6.0'
@@ -340,13 +703,8 @@ def calculate_risk_score(student_id):
         factors['academics'] = 'Good performance'
     
     # Factor 2: Attendance (30 points)
-    cursor.execute('''
-        SELECT AVG(attendance_percentage) as avg_attendance 
-        FROM attendance 
-        WHERE student_id = ?
-    ''', (student_id,))
-    attendance_data = cursor.fetchone()
-    avg_attendance = attendance_data['avg_attendance'] if attendance_data and attendance_data['avg_attendance'] is not None else 100
+    if avg_attendance is None:
+        avg_attendance = 100
     
     if avg_attendance < 70:
         risk_score += 30
@@ -361,21 +719,15 @@ def calculate_risk_score(student_id):
         factors['attendance'] = f'Good - {avg_attendance:.1f}% attendance'
     
     # Factor 3: Fee Pending (20 points)
-    if student['fee_pending']:
+    if fee_pending:
         risk_score += 20
         factors['fees'] = 'Fee payment pending'
     else:
         factors['fees'] = 'No pending fees'
     
     # Factor 4: Mental Health/Mood (20 points)
-    cursor.execute('''
-        SELECT AVG(mood_score) as avg_mood 
-        FROM moods 
-        WHERE student_id = ? 
-        AND created_at >= datetime('now', '-7 days')
-    ''', (student_id,))
-    mood_data = cursor.fetchone()
-    avg_mood = mood_data['avg_mood'] if mood_data and mood_data['avg_mood'] else 7
+    if not avg_mood:
+        avg_mood = 7
     
     if avg_mood < 4:
         risk_score += 20
@@ -389,8 +741,6 @@ def calculate_risk_score(student_id):
     else:
         factors['mental_health'] = f'Good mood (avg: {avg_mood:.1f}/10)'
     
-    conn.close()
-    
     # Determine risk level
     if risk_score >= 50:
         risk_level = 'high'
@@ -401,6 +751,259 @@ def calculate_risk_score(student_id):
     
     return risk_level, risk_score, factors
 
+def calculate_risk_score(student_id):
+    """
+    Calculate dropout risk score based on multiple factors
+    Returns: (risk_level, risk_score, factors)
+    risk_level: 'high', 'moderate', or 'low'
+    risk_score: 0-100
+    factors: dict of contributing factors
+    """
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    # Get student data
+    cursor.execute('SELECT * FROM students WHERE id = ?', (student_id,))
+    student = cursor.fetchone()
+    
+    if not student:
+        conn.close()
+        return 'low', 0, {}
+    
+    cursor.execute('''
+        SELECT AVG(attendance_percentage) as avg_attendance 
+        FROM attendance 
+        WHERE student_id = ?
+    ''', (student_id,))
+    attendance_data = cursor.fetchone()
+    
+    cursor.execute('''
+        SELECT AVG(mood_score) as avg_mood 
+        FROM moods 
+        WHERE student_id = ? 
+        AND created_at >= datetime('now', '-7 days')
+    ''', (student_id,))
+    mood_data = cursor.fetchone()
+    
+    conn.close()
+    
+    return _score_risk_factors(
+        student['cgpa'],
+        student['fee_pending'],
+        attendance_data['avg_attendance'] if attendance_data else None,
+        mood_data['avg_mood'] if mood_data else None
+    )
+
+# SQLite caps bound parameters per statement (999 on older builds)
+RISK_BATCH_SIZE = 900
+
+COHORT_RISK_QUERY = '''
+    SELECT s.id, s.cgpa, s.fee_pending, a.avg_attendance, m.avg_mood,
+           datetime(m.oldest_mood, '+7 days') as mood_window_expires_at
+    FROM students s
+    LEFT JOIN (
+        SELECT student_id, AVG(attendance_percentage) as avg_attendance
+        FROM attendance
+        GROUP BY student_id
+    ) a ON a.student_id = s.id
+    LEFT JOIN (
+        SELECT student_id, AVG(mood_score) as avg_mood, MIN(created_at) as oldest_mood
+        FROM moods
+        WHERE created_at >= datetime('now', '-7 days')
+        GROUP BY student_id
+    ) m ON m.student_id = s.id
+'''
+
+def _chunked(ids):
+    """Split a list of ids into chunks that fit in one IN (...) clause"""
+    for start in range(0, len(ids), RISK_BATCH_SIZE):
+        yield ids[start:start + RISK_BATCH_SIZE]
+
+def _fetch_cohort_risk_rows(cursor, student_ids=None):
+    """Run the cohort risk aggregate for every student or the given ids"""
+    if student_ids is None:
+        cursor.execute(COHORT_RISK_QUERY)
+        return cursor.fetchall()
+    
+    rows = []
+    for chunk in _chunked(student_ids):
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(COHORT_RISK_QUERY + f' WHERE s.id IN ({placeholders})', chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+def calculate_risk_scores(student_ids=None, conn=None):
+    """
+    Calculate dropout risk for many students with aggregate queries
+    Args:
+        student_ids: iterable of student ids, or None for every student
+        conn: optional open connection to reuse
+    Returns: dict of student_id -> (risk_level, risk_score, factors),
+    identical to calling calculate_risk_score() for each student.
+    Unknown ids map to ('low', 0, {}) like the per-student function.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    cursor = conn.cursor()
+    
+    results = {}
+    if student_ids is not None:
+        student_ids = list(dict.fromkeys(student_ids))
+        for student_id in student_ids:
+            results[student_id] = ('low', 0, {})
+    
+    for row in _fetch_cohort_risk_rows(cursor, student_ids):
+        results[row['id']] = _score_risk_factors(
+            row['cgpa'], row['fee_pending'], row['avg_attendance'], row['avg_mood']
+        )
+    
+    if own_conn:
+        conn.close()
+    
+    return results
+
+def ensure_schema_current():
+    """Apply pending schema migrations (indexes, derived tables) to the database"""
+    from migrations import apply_migrations
+    conn = sqlite3.connect(app.config['DATABASE'])
+    apply_migrations(conn)
+    conn.close()
+
+def refresh_student_risk(student_ids=None, conn=None):
+    """
+    Recompute and store materialized risk rows in student_risk
+    Args:
+        student_ids: iterable of student ids, or None to rebuild every row
+        conn: optional open connection; the caller is responsible for commit
+    Returns: number of rows written
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    cursor = conn.cursor()
+    
+    if student_ids is not None:
+        student_ids = list(dict.fromkeys(student_ids))
+    else:
+        cursor.execute('DELETE FROM student_risk')
+    
+    rows = _fetch_cohort_risk_rows(cursor, student_ids)
+    records = []
+    for row in rows:
+        risk_level, risk_score, factors = _score_risk_factors(
+            row['cgpa'], row['fee_pending'], row['avg_attendance'], row['avg_mood']
+        )
+        records.append((
+            row['id'], risk_level, risk_score, json.dumps(factors), row['mood_window_expires_at']
+        ))
+    
+    cursor.executemany('''
+        INSERT OR REPLACE INTO student_risk
+            (student_id, risk_level, risk_score, factors, stale, expires_at, updated_at)
+        VALUES (?, ?, ?, ?, 0, ?, CURRENT_TIMESTAMP)
+    ''', records)
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+    
+    return len(records)
+
+def refresh_outdated_risk(conn, student_ids=None):
+    """
+    Refresh student_risk rows that are missing, stale, or whose 7-day mood
+    window has moved since they were computed, and commit
+    Returns: number of rows refreshed
+    """
+    cursor = conn.cursor()
+    outdated_query = '''
+        SELECT s.id FROM students s
+        LEFT JOIN student_risk r ON r.student_id = s.id
+        WHERE (r.student_id IS NULL OR r.stale = 1 OR r.expires_at <= datetime('now'))
+    '''
+    
+    if student_ids is None:
+        cursor.execute(outdated_query)
+        outdated = [row['id'] for row in cursor.fetchall()]
+    else:
+        outdated = []
+        for chunk in _chunked(list(student_ids)):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(outdated_query + f' AND s.id IN ({placeholders})', chunk)
+            outdated.extend(row['id'] for row in cursor.fetchall())
+    
+    if outdated:
+        refresh_student_risk(outdated, conn)
+        conn.commit()
+    
+    return len(outdated)
+
+def get_student_risk(student_ids=None, conn=None):
+    """
+    Read materialized risk, refreshing only rows that are missing, stale,
+    or whose 7-day mood window has moved since they were computed
+    Returns: dict of student_id -> (risk_level, risk_score, factors),
+    the same shape as calculate_risk_scores()
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    cursor = conn.cursor()
+    
+    results = {}
+    if student_ids is not None:
+        student_ids = list(dict.fromkeys(student_ids))
+        for student_id in student_ids:
+            results[student_id] = ('low', 0, {})
+    
+    refresh_outdated_risk(conn, student_ids)
+    
+    select_query = 'SELECT student_id, risk_level, risk_score, factors FROM student_risk'
+    if student_ids is None:
+        cursor.execute(select_query)
+        rows = cursor.fetchall()
+    else:
+        rows = []
+        for chunk in _chunked(student_ids):
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(select_query + f' WHERE student_id IN ({placeholders})', chunk)
+            rows.extend(cursor.fetchall())
+    
+    for row in rows:
+        results[row['student_id']] = (row['risk_level'], row['risk_score'], json.loads(row['factors']))
+    
+    if own_conn:
+        conn.close()
+    
+    return results
+
+@app.cli.command('check-risk')
+@click.option('--rebuild', is_flag=True, help='Rebuild student_risk from scratch after checking.')
+def check_risk_command(rebuild):
+    """Compare student_risk against calculate_risk_score() for every student"""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id FROM students')
+    student_ids = [row['id'] for row in cursor.fetchall()]
+    
+    materialized = get_student_risk(student_ids, conn)
+    mismatches = 0
+    for student_id in student_ids:
+        expected = calculate_risk_score(student_id)
+        if materialized[student_id] != expected:
+            mismatches += 1
+            click.echo(f"Student {student_id}: stored {materialized[student_id][:2]}, expected {expected[:2]}")
+    
+    click.echo(f"Checked {len(student_ids)} students, {mismatches} mismatches")
+    
+    if rebuild:
+        count = refresh_student_risk(conn=conn)
+        conn.commit()
+        click.echo(f"Rebuilt student_risk with {count} rows")
+    
+    conn.close()
+
 def get_wellness_tips(risk_level, factors):
     """Generate personalized wellness tips based on risk factors"""
     tips = []
@@ -629,8 +1232,8 @@ def student_dashboard(id):
     cursor.execute('SELECT * FROM students WHERE id = ?', (id,))
     student = cursor.fetchone()
     
-    # Calculate risk
-    risk_level, risk_score, factors = calculate_risk_score(id)
+    # Read materialized risk
+    risk_level, risk_score, factors = get_student_risk([id], conn)[id]
     
     # Get wellness tips
     tips = get_wellness_tips(risk_level, factors)
@@ -701,6 +1304,7 @@ def mood():
             INSERT INTO moods (student_id, mood_score, notes)
             VALUES (?, ?, ?)
         ''', (session['user_id'], mood_score, notes))
+        refresh_student_risk([session['user_id']], conn)
         
         conn.commit()
         conn.close()
@@ -732,22 +1336,47 @@ def journal():
         conn.commit()
         conn.close()
         
+        # Emotion analysis happens off the request path
+        if journal_worker:
+            journal_worker.notify()
+        
         flash('Journal entry saved!', 'success')
         return redirect(url_for('journal'))
     
-    # Get existing journals
+    # Get existing journals with any emotion analysis already written by the worker
     conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
-        SELECT * FROM journals 
-        WHERE student_id = ? 
-        ORDER BY created_at DESC
+        SELECT j.*, je.emotion 
+        FROM journals j
+        LEFT JOIN journal_emotions je ON je.journal_id = j.id
+        WHERE j.student_id = ? 
+        ORDER BY j.created_at DESC
     ''', (session['user_id'],))
     journals = cursor.fetchall()
     conn.close()
     
     return render_template('journal.html', journals=journals)
 
+@app.cli.command('backfill-journal-emotions')
+@click.option('--batch-size', default=32, show_default=True, help='Journal entries per model call.')
+@click.option('--reanalyze', is_flag=True, help='Also redo entries analyzed by a different model version.')
+def backfill_journal_emotions_command(batch_size, reanalyze):
+    """Run emotion analysis over journal entries missing from journal_emotions"""
+    from journal_enrichment import JournalEmotionWorker
+    get_db().close()
+    worker = JournalEmotionWorker(_connect, build_emotion_analyzer(), batch_size=batch_size)
+    
+    total = 0
+    while True:
+        count = worker.process_pending(reanalyze=reanalyze)
+        if not count:
+            break
+        total += count
+        click.echo(f"Processed {total} journal entries...")
+    click.echo(f"Backfilled {total} journal entries with model {worker.model_version}; "
+               f"entries that failed {worker.max_attempts} times are in journal_emotion_failures")
+
 @app.route('/schedule_meeting', methods=['POST'])
 def schedule_meeting():
     """Schedule a meeting with counselor"""
@@ -763,29 +1392,25 @@ def schedule_meeting():
         VALUES (?, 'scheduled')
     ''', (session['user_id'],))
     
-    # Get student info
-    cursor.execute('SELECT name, roll_number FROM students WHERE id = ?', (session['user_id'],))
-    student = cursor.fetchone()
-    
-    # Create notification for all counselors
-    cursor.execute('SELECT id FROM counselors')
-    counselors = cursor.fetchall()
-    
-    for counselor in counselors:
-        cursor.execute('''
-            INSERT INTO notifications (user_id, user_type, title, message, link, is_read, reference_id)
-            VALUES (?, 'counselor', ?, ?, ?, 0, ?)
-        ''', (
-            counselor['id'],
-            'New Meeting Request',
-            f"{student['name']} ({student['roll_number']}) has requested a counseling session.",
-            f"/counselor#student{session['user_id']}",
-            session['user_id']
-        ))
+    # Create notification for all counselors in one statement
+    cursor.execute('''
+        INSERT INTO notifications (user_id, user_type, title, message, link, is_read, reference_id)
+        SELECT c.id, 'counselor', ?,
+               s.name || ' (' || s.roll_number || ') has requested a counseling session.',
+               ?, 0, s.id
+        FROM counselors c
+        JOIN students s ON s.id = ?
+    ''', (
+        'New Meeting Request',
+        f"/counselor#student{session['user_id']}",
+        session['user_id']
+    ))
     
     conn.commit()
     conn.close()
     
+    notification_hub.publish_role('counselor')
+    
     return jsonify({'success': True, 'message': 'Meeting scheduled successfully! You will receive a call soon.'})
 
 @app.route('/schedule_meeting_for_student/<int:student_id>', methods=['POST'])
@@ -825,18 +1450,15 @@ def schedule_meeting_for_student(student_id):
     conn.commit()
     conn.close()
     
+    notification_hub.publish(student_id, 'student')
+    
     return jsonify({
         'success': True, 
         'message': f'Meeting scheduled with {student["name"]}. Student has been notified.'
     })
 
-@app.route('/notifications')
-def get_notifications():
-    """Get notifications for current user"""
-    if 'user_id' not in session:
-        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
-    
-    conn = get_db()
+def _load_notifications(conn, user_id, user_type):
+    """Return (latest 20 notifications, unread count) for a user"""
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -844,18 +1466,29 @@ def get_notifications():
         WHERE user_id = ? AND user_type = ?
         ORDER BY created_at DESC
         LIMIT 20
-    ''', (session['user_id'], session.get('user_type')))
+    ''', (user_id, user_type))
     
     notifications = [dict(row) for row in cursor.fetchall()]
     
-    # Get unread count
+    # Get unread count (maintained by triggers on notifications)
     cursor.execute('''
-        SELECT COUNT(*) as count FROM notifications 
-        WHERE user_id = ? AND user_type = ? AND is_read = 0
-    ''', (session['user_id'], session.get('user_type')))
+        SELECT unread_count FROM notification_counters
+        WHERE user_id = ? AND user_type = ?
+    ''', (user_id, user_type))
     
-    unread_count = cursor.fetchone()['count']
+    row = cursor.fetchone()
+    unread_count = row['unread_count'] if row else 0
     
+    return notifications, unread_count
+
+@app.route('/notifications')
+def get_notifications():
+    """Get notifications for current user"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    conn = get_db()
+    notifications, unread_count = _load_notifications(conn, session['user_id'], session.get('user_type'))
     conn.close()
     
     return jsonify({
@@ -864,6 +1497,65 @@ def get_notifications():
         'unread_count': unread_count
     })
 
+@app.route('/notifications/stream')
+def notification_stream():
+    """
+    Server-Sent Events stream of the current user's notifications
+    Sends the full list on connect and again whenever it changes; the
+    client falls back to polling /notifications if streams are unavailable.
+    Returns 503 with Retry-After when this worker already has
+    NOTIFICATION_STREAM_MAX streams open.
+    """
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    user_id = session['user_id']
+    user_type = session.get('user_type')
+    
+    signal = notification_hub.subscribe(user_id, user_type)
+    if signal is None:
+        return Response(
+            f"retry: {NOTIFICATION_STREAM_RETRY_SECONDS * 1000}\n\n",
+            status=503,
+            mimetype='text/event-stream',
+            headers={'Retry-After': str(NOTIFICATION_STREAM_RETRY_SECONDS), 'Cache-Control': 'no-cache'}
+        )
+    
+    def snapshot():
+        # Short-lived connection so an idle stream holds no database handle
+        conn = _connect()
+        try:
+            notifications, unread_count = _load_notifications(conn, user_id, user_type)
+        finally:
+            conn.close()
+        payload = {'notifications': notifications, 'unread_count': unread_count}
+        return f"data: {json.dumps(payload)}\n\n"
+    
+    def generate():
+        yield "retry: 5000\n\n"
+        yield snapshot()
+        
+        deadline = time.monotonic() + NOTIFICATION_STREAM_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                signal.get(timeout=NOTIFICATION_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield snapshot()
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Runs when the server closes the response, even if the stream never started
+    response.call_on_close(lambda: notification_hub.unsubscribe(user_id, user_type, signal))
+    return response
+
 @app.route('/mark_notification_read/<int:notification_id>', methods=['POST'])
 def mark_notification_read(notification_id):
     """Mark a notification as read"""
@@ -882,11 +1574,46 @@ def mark_notification_read(notification_id):
     conn.commit()
     conn.close()
     
+    notification_hub.publish(session['user_id'], session.get('user_type'))
+    
     return jsonify({'success': True})
 
+@app.route('/mark_all_notifications_read', methods=['POST'])
+def mark_all_notifications_read():
+    """Mark every unread notification for the current user as read"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        UPDATE notifications 
+        SET is_read = 1 
+        WHERE user_id = ? AND user_type = ? AND is_read = 0
+    ''', (session['user_id'], session.get('user_type')))
+    updated = cursor.rowcount
+    
+    conn.commit()
+    conn.close()
+    
+    notification_hub.publish(session['user_id'], session.get('user_type'))
+    
+    return jsonify({'success': True, 'updated': updated})
+
+@app.cli.command('repair-notification-counters')
+def repair_notification_counters_command():
+    """Recompute unread notification counters from the notifications table"""
+    from migrations import NOTIFICATION_COUNTERS_REBUILD
+    conn = get_db()
+    conn.executescript('BEGIN;\n' + NOTIFICATION_COUNTERS_REBUILD + '\nCOMMIT;')
+    count = conn.execute('SELECT COUNT(*) FROM notification_counters').fetchone()[0]
+    conn.close()
+    click.echo(f"Rebuilt unread counters for {count} users")
+
 @app.route('/counselor')
 def counselor_dashboard():
-    """Counselor dashboard showing all students sorted by risk"""
+    """Counselor dashboard; the student list is paged in from /counselor/students"""
     if 'user_id' not in session or session.get('user_type') != 'counselor':
         flash('Please login as counselor to continue', 'error')
         return redirect(url_for('login'))
@@ -894,32 +1621,20 @@ def counselor_dashboard():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Get all students
-    cursor.execute('SELECT * FROM students ORDER BY name')
-    students = cursor.fetchall()
-    
-    # Calculate risk for each student
-    students_with_risk = []
+    # Count students per risk level from the materialized table
+    refresh_outdated_risk(conn)
+    cursor.execute('''
+        SELECT risk_level, COUNT(*) as count
+        FROM student_risk
+        GROUP BY risk_level
+    ''')
     risk_counts = {'high': 0, 'moderate': 0, 'low': 0}
+    for row in cursor.fetchall():
+        risk_counts[row['risk_level']] = row['count']
     
-    for student in students:
-        risk_level, risk_score, factors = calculate_risk_score(student['id'])
-        students_with_risk.append({
-            'id': student['id'],
-            'name': student['name'],
-            'email': student['email'],
-            'roll_number': student['roll_number'],
-            'department': student['department'],
-            'semester': student['semester'],
-            'cgpa': student['cgpa'],
-            'risk_level': risk_level,
-            'risk_score': risk_score,
-            'factors': factors
-        })
-        risk_counts[risk_level] += 1
-    
-    # Sort by risk score (highest first)
-    students_with_risk.sort(key=lambda x: x['risk_score'], reverse=True)
+    # Department list for the filter dropdown
+    cursor.execute('SELECT DISTINCT department FROM students ORDER BY department')
+    departments = [row['department'] for row in cursor.fetchall()]
     
     # Get upcoming meetings
     cursor.execute('''
@@ -934,10 +1649,157 @@ def counselor_dashboard():
     conn.close()
     
     return render_template('counselor_dashboard.html',
-                         students=students_with_risk,
                          risk_counts=risk_counts,
+                         total_students=sum(risk_counts.values()),
+                         departments=departments,
                          meetings=meetings)
 
+STUDENT_PAGE_SIZE = 25
+STUDENT_PAGE_MAX = 100
+
+def _student_risk_filters(args):
+    """
+    WHERE conditions for the counselor student list, shared by the JSON
+    pages and the CSV export
+    Args:
+        args: request.args with risk_level, department, semester and q
+    Returns: (conditions, params)
+    Raises: ValueError on a bad semester or risk_level
+    """
+    semester = args.get('semester')
+    semester = int(semester) if semester else None
+    risk_level = args.get('risk_level')
+    if risk_level and risk_level not in ('high', 'moderate', 'low'):
+        raise ValueError('risk_level')
+    
+    conditions = []
+    params = []
+    if risk_level:
+        conditions.append('r.risk_level = ?')
+        params.append(risk_level)
+    if args.get('department'):
+        conditions.append('s.department = ?')
+        params.append(args['department'])
+    if semester is not None:
+        conditions.append('s.semester = ?')
+        params.append(semester)
+    search = args.get('q', '').strip()
+    if search:
+        conditions.append('(s.name LIKE ? OR s.roll_number LIKE ? OR s.email LIKE ?)')
+        params.extend([f'%{search}%'] * 3)
+    return conditions, params
+
+@app.route('/counselor/students')
+def counselor_students():
+    """
+    Page through students by risk (JSON), highest risk first
+    Query params:
+        limit: page size (default 25, max 100)
+        cursor: next_cursor from the previous page, "<risk_score>:<student_id>"
+        risk_level: high / moderate / low
+        department, semester: exact match filters
+        q: search in name, roll number or email
+    Returns: { "students": [...], "next_cursor": "..." or null }
+    """
+    if 'user_id' not in session or session.get('user_type') != 'counselor':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    try:
+        limit = min(max(int(request.args.get('limit', STUDENT_PAGE_SIZE)), 1), STUDENT_PAGE_MAX)
+        cursor_arg = request.args.get('cursor')
+        after = tuple(int(part) for part in cursor_arg.split(':')) if cursor_arg else None
+        if after is not None and len(after) != 2:
+            raise ValueError('cursor')
+        conditions, params = _student_risk_filters(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit, semester, risk_level or cursor'}), 400
+    
+    if after is not None:
+        conditions.insert(0, '(r.risk_score, r.student_id) < (?, ?)')
+        params[:0] = after
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    # Refresh once per listing; later pages keep the order the first page saw
+    if after is None:
+        refresh_outdated_risk(conn)
+    cursor.execute(f'''
+        SELECT s.id, s.name, s.email, s.roll_number, s.department, s.semester, s.cgpa,
+               r.risk_level, r.risk_score, r.factors
+        FROM student_risk r
+        JOIN students s ON s.id = r.student_id
+        {where}
+        ORDER BY r.risk_score DESC, r.student_id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+    rows = cursor.fetchall()
+    conn.close()
+    
+    students = []
+    for row in rows[:limit]:
+        student = dict(row)
+        student['factors'] = json.loads(student['factors'])
+        students.append(student)
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last = students[-1]
+        next_cursor = f"{last['risk_score']}:{last['id']}"
+    
+    return jsonify({
+        'success': True,
+        'students': students,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/counselor/students.csv')
+def counselor_students_csv():
+    """
+    Download every student matching the /counselor/students filters as CSV,
+    highest risk first
+    Query params: risk_level, department, semester, q (as /counselor/students)
+    """
+    if 'user_id' not in session or session.get('user_type') != 'counselor':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    try:
+        conditions, params = _student_risk_filters(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid semester or risk_level'}), 400
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    refresh_outdated_risk(conn)
+    cursor.execute(f'''
+        SELECT s.name, s.roll_number, s.email, s.department, s.semester, s.cgpa,
+               r.risk_level, r.risk_score, r.factors
+        FROM student_risk r
+        JOIN students s ON s.id = r.student_id
+        {where}
+        ORDER BY r.risk_score DESC, r.student_id DESC
+    ''', params)
+    rows = cursor.fetchall()
+    conn.close()
+    
+    import csv
+    import io
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['name', 'roll_number', 'email', 'department', 'semester', 'cgpa',
+                     'risk_level', 'risk_score', 'factors'])
+    for row in rows:
+        writer.writerow(list(row[:-1]) + ['; '.join(json.loads(row['factors']))])
+    
+    return Response(
+        out.getvalue(),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=student_risk_report.csv'}
+    )
+
 @app.route('/student_details/<int:id>')
 def student_details(id):
     """Get detailed student data for counselor view (AJAX)"""
@@ -976,12 +1838,26 @@ def student_details(id):
     ''', (id,))
     attendance = [dict(row) for row in cursor.fetchall()]
     
+    # Primary emotions of the past 30 days of journal entries (precomputed
+    # by the enrichment worker; journal text itself stays private)
+    cursor.execute('''
+        SELECT je.emotion, COUNT(*) as entries, AVG(je.score) as avg_score
+        FROM journal_emotions je
+        JOIN journals j ON j.id = je.journal_id
+        WHERE je.student_id = ?
+        AND j.created_at >= datetime('now', '-30 days')
+        GROUP BY je.emotion
+        ORDER BY entries DESC
+    ''', (id,))
+    journal_emotions = [dict(row) for row in cursor.fetchall()]
+    
     conn.close()
     
     return jsonify({
         'moods': moods,
         'activities': activities,
-        'attendance': attendance
+        'attendance': attendance,
+        'journal_emotions': journal_emotions
     })
 
 @app.route('/analyze_mood', methods=['POST'])
@@ -1038,6 +1914,46 @@ def analyze_mood():
             'error': str(e)
         }), 500
 
+def _dropout_inputs(data, analyze_text=True):
+    """
+    Split a /predict_dropout payload into model inputs
+    
+    Returns:
+        tuple: (student_data, emotion_data, text) where text is set when the
+               emotion features should come from analyzing it
+    """
+    # Extract student data
+    student_data = {
+        'cgpa': data.get('cgpa', 7.0),
+        'attendance_percentage': data.get('attendance_percentage', 85.0),
+        'fee_pending': data.get('fee_pending', False),
+        'mood_score': data.get('mood_score', 6.5),
+        'activities_per_week': data.get('activities_per_week', 3.0),
+        'semester': data.get('semester', 4)
+    }
+    
+    # Option 1: Emotion data provided directly
+    if 'emotion_data' in data:
+        return student_data, data['emotion_data'], None
+    
+    # Option 2: Text provided for emotion analysis
+    if 'text' in data and analyze_text:
+        return student_data, None, data['text']
+    
+    # Option 3: Individual emotion scores provided
+    if any(key in data for key in ['emotion_joy', 'emotion_sadness', 'emotion_anger', 'emotion_fear']):
+        emotion_data = {
+            'all_emotions': [
+                {'emotion': 'joy', 'score': data.get('emotion_joy', 0.0)},
+                {'emotion': 'sadness', 'score': data.get('emotion_sadness', 0.0)},
+                {'emotion': 'anger', 'score': data.get('emotion_anger', 0.0)},
+                {'emotion': 'fear', 'score': data.get('emotion_fear', 0.0)}
+            ]
+        }
+        return student_data, emotion_data, None
+    
+    return student_data, None, None
+
 @app.route('/predict_dropout', methods=['POST'])
 def predict_dropout():
     """
@@ -1068,39 +1984,11 @@ def predict_dropout():
                 'error': 'Missing request body'
             }), 400
         
-        # Extract student data
-        student_data = {
-            'cgpa': data.get('cgpa', 7.0),
-            'attendance_percentage': data.get('attendance_percentage', 85.0),
-            'fee_pending': data.get('fee_pending', False),
-            'mood_score': data.get('mood_score', 6.5),
-            'activities_per_week': data.get('activities_per_week', 3.0),
-            'semester': data.get('semester', 4)
-        }
+        student_data, emotion_data, text = _dropout_inputs(data, analyze_text=bool(emotion_analyzer))
         
-        # Handle emotion data
-        emotion_data = None
-        
-        # Option 1: Emotion data provided directly
-        if 'emotion_data' in data:
-            emotion_data = data['emotion_data']
-        
-        # Option 2: Text provided for emotion analysis
-        elif 'text' in data and emotion_analyzer:
-            text = data['text']
-            if text and text.strip():
-                emotion_data = emotion_analyzer.analyze(text)
-        
-        # Option 3: Individual emotion scores provided
-        elif any(key in data for key in ['emotion_joy', 'emotion_sadness', 'emotion_anger', 'emotion_fear']):
-            emotion_data = {
-                'all_emotions': [
-                    {'emotion': 'joy', 'score': data.get('emotion_joy', 0.0)},
-                    {'emotion': 'sadness', 'score': data.get('emotion_sadness', 0.0)},
-                    {'emotion': 'anger', 'score': data.get('emotion_anger', 0.0)},
-                    {'emotion': 'fear', 'score': data.get('emotion_fear', 0.0)}
-                ]
-            }
+        # Text provided for emotion analysis
+        if text and text.strip():
+            emotion_data = emotion_analyzer.analyze(text)
         
         # Make prediction
         result = dropout_predictor.predict(student_data, emotion_data)
@@ -1110,7 +1998,9 @@ def predict_dropout():
             'risk_score': result['risk_score'],
             'risk_category': result['risk_category'],
             'explanation': result['explanation'],
-            'risk_probabilities': result.get('risk_probabilities', {})
+            'risk_probabilities': result.get('risk_probabilities', {}),
+            'backend': result.get('backend'),
+            'latency_ms': result.get('latency_ms')
         })
         
     except Exception as e:
@@ -1119,6 +2009,570 @@ def predict_dropout():
             'error': str(e)
         }), 500
 
+# Bulk scoring limits (/analyze_mood/batch, /predict_dropout/batch)
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 5000))
+BATCH_MAX_BYTES = int(os.getenv('BATCH_MAX_BYTES', 10 * 1024 * 1024))
+BATCH_MAX_TEXT_CHARS = int(os.getenv('BATCH_MAX_TEXT_CHARS', 20000))
+EMOTION_BATCH_CHUNK = 64
+DROPOUT_BATCH_CHUNK = 1024
+
+def _read_batch_items():
+    """
+    Parse a bulk scoring request body
+    
+    Accepts a JSON array, {"items": [...]}, or NDJSON (one item per line,
+    Content-Type application/x-ndjson). NDJSON lines that are not valid JSON
+    become per-item errors instead of failing the request.
+    
+    Returns:
+        tuple: (items, error_response) where items is a list of
+               (item, error) pairs and error_response is set when the
+               request as a whole is rejected
+    """
+    if request.content_length is not None and request.content_length > BATCH_MAX_BYTES:
+        return None, (jsonify({
+            'success': False,
+            'error': f'Request body exceeds {BATCH_MAX_BYTES} bytes'
+        }), 413)
+    
+    body = request.stream.read(BATCH_MAX_BYTES + 1)
+    if len(body) > BATCH_MAX_BYTES:
+        return None, (jsonify({
+            'success': False,
+            'error': f'Request body exceeds {BATCH_MAX_BYTES} bytes'
+        }), 413)
+    
+    items = []
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        lines = [line for line in body.decode('utf-8', errors='replace').splitlines() if line.strip()]
+        if len(lines) > BATCH_MAX_ITEMS:
+            return None, (jsonify({
+                'success': False,
+                'error': f'Batch exceeds {BATCH_MAX_ITEMS} items'
+            }), 413)
+        for line in lines:
+            try:
+                items.append((json.loads(line), None))
+            except ValueError:
+                items.append((None, 'Invalid JSON'))
+    else:
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = data.get('items')
+        if not isinstance(data, list):
+            return None, (jsonify({
+                'success': False,
+                'error': 'Expected a JSON array, {"items": [...]}, or NDJSON body'
+            }), 400)
+        if len(data) > BATCH_MAX_ITEMS:
+            return None, (jsonify({
+                'success': False,
+                'error': f'Batch exceeds {BATCH_MAX_ITEMS} items'
+            }), 413)
+        items = [(item, None) for item in data]
+    
+    if not items:
+        return None, (jsonify({
+            'success': False,
+            'error': 'Batch is empty'
+        }), 400)
+    
+    return items, None
+
+def _batch_text(item):
+    """Validate one /analyze_mood/batch item and return its text"""
+    text = item.get('text') if isinstance(item, dict) else item
+    if not isinstance(text, str):
+        raise ValueError('Missing "text" field')
+    if not text.strip():
+        raise ValueError('Text cannot be empty')
+    if len(text) > BATCH_MAX_TEXT_CHARS:
+        raise ValueError(f'Text exceeds {BATCH_MAX_TEXT_CHARS} characters')
+    return text
+
+def _score_chunk(score_batch, inputs):
+    """
+    Run score_batch over one chunk of bulk inputs, retrying per item on failure
+    
+    If the batch call raises, or returns error results for some items, those
+    items are scored again one at a time so a single bad input only fails
+    itself instead of the whole chunk.
+    
+    Args:
+        score_batch: callable taking a list of inputs and returning one result dict per input
+        inputs: list of inputs
+        
+    Returns:
+        list: one result dict per input; failures have an 'error' key
+    """
+    try:
+        results = list(score_batch(inputs))
+    except Exception as e:
+        print(f"Batch of {len(inputs)} failed ({e}), retrying items one at a time")
+        results = [{'error': str(e)} for _ in inputs]
+    
+    if len(inputs) > 1:
+        for i, result in enumerate(results):
+            if 'error' not in result:
+                continue
+            try:
+                results[i] = score_batch([inputs[i]])[0]
+            except Exception as e:
+                results[i] = {'error': str(e)}
+    return results
+
+def _ndjson_response(lines):
+    """Stream an iterator of dicts as newline-delimited JSON"""
+    return Response(
+        stream_with_context(json.dumps(line) + '\n' for line in lines),
+        mimetype='application/x-ndjson'
+    )
+
+@app.route('/analyze_mood/batch', methods=['POST'])
+def analyze_mood_batch():
+    """
+    Analyze emotion for many texts in one request
+    Accepts: JSON array / {"items": [...]} / NDJSON of {"text": "..."} or plain strings
+    Returns: NDJSON stream, one line per item in input order:
+             { "index": 0, "success": true, "emotion": ..., "score": ..., "all_emotions": [...] }
+             { "index": 1, "success": false, "error": "Text cannot be empty" }
+    """
+    if ai_models_loading:
+        return jsonify({
+            'success': False,
+            'error': 'AI models are still loading. Please try again in a moment.'
+        }), 503
+    
+    if not emotion_analyzer:
+        return jsonify({
+            'success': False,
+            'error': 'Emotion analyzer not initialized'
+        }), 503
+    
+    items, error_response = _read_batch_items()
+    if error_response:
+        return error_response
+    
+    analyzer = emotion_analyzer
+    
+    def generate():
+        for start in range(0, len(items), EMOTION_BATCH_CHUNK):
+            chunk = items[start:start + EMOTION_BATCH_CHUNK]
+            lines = [None] * len(chunk)
+            texts, positions = [], []
+            for i, (item, error) in enumerate(chunk):
+                try:
+                    if error:
+                        raise ValueError(error)
+                    texts.append(_batch_text(item))
+                    positions.append(i)
+                except ValueError as e:
+                    lines[i] = {'index': start + i, 'success': False, 'error': str(e)}
+            
+            if texts:
+                for i, result in zip(positions, _score_chunk(analyzer.analyze_batch, texts)):
+                    if 'error' in result:
+                        lines[i] = {'index': start + i, 'success': False, 'error': result['error']}
+                    else:
+                        lines[i] = {
+                            'index': start + i,
+                            'success': True,
+                            'emotion': result['emotion'],
+                            'score': result['score'],
+                            'all_emotions': result.get('all_emotions', [])
+                        }
+            
+            yield from lines
+    
+    return _ndjson_response(generate())
+
+@app.route('/predict_dropout/batch', methods=['POST'])
+def predict_dropout_batch():
+    """
+    Predict dropout risk for many students in one request
+    Accepts: JSON array / {"items": [...]} / NDJSON of /predict_dropout payloads
+    Returns: NDJSON stream, one line per item in input order:
+             { "index": 0, "success": true, "risk_score": ..., "risk_category": ..., ... }
+             { "index": 1, "success": false, "error": "Invalid value for cgpa" }
+    """
+    if ai_models_loading:
+        return jsonify({
+            'success': False,
+            'error': 'AI models are still loading. Please try again in a moment.'
+        }), 503
+    
+    if not dropout_predictor:
+        return jsonify({
+            'success': False,
+            'error': 'Dropout predictor not initialized'
+        }), 503
+    
+    items, error_response = _read_batch_items()
+    if error_response:
+        return error_response
+    
+    predictor, analyzer = dropout_predictor, emotion_analyzer
+    
+    def validate(item):
+        if not isinstance(item, dict):
+            raise ValueError('Item must be a JSON object')
+        student_data, emotion_data, text = _dropout_inputs(item, analyze_text=bool(analyzer))
+        for field in ('cgpa', 'attendance_percentage', 'mood_score', 'activities_per_week', 'semester'):
+            try:
+                student_data[field] = float(student_data[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid value for {field}')
+        if emotion_data is not None:
+            try:
+                for e in emotion_data.get('all_emotions', []):
+                    e['score'] = float(e['score'])
+                    e['emotion'] = str(e['emotion'])
+            except (AttributeError, KeyError, TypeError, ValueError):
+                raise ValueError('Invalid emotion data')
+        if text is not None:
+            if not isinstance(text, str) or len(text) > BATCH_MAX_TEXT_CHARS:
+                raise ValueError(f'"text" must be a string of at most {BATCH_MAX_TEXT_CHARS} characters')
+            if not text.strip():
+                text = None
+        return student_data, emotion_data, text
+    
+    def generate():
+        for start in range(0, len(items), DROPOUT_BATCH_CHUNK):
+            chunk = items[start:start + DROPOUT_BATCH_CHUNK]
+            lines = [None] * len(chunk)
+            students, emotions, texts, positions = [], [], [], []
+            for i, (item, error) in enumerate(chunk):
+                try:
+                    if error:
+                        raise ValueError(error)
+                    student_data, emotion_data, text = validate(item)
+                except ValueError as e:
+                    lines[i] = {'index': start + i, 'success': False, 'error': str(e)}
+                    continue
+                if text:
+                    texts.append((len(students), text))
+                students.append(student_data)
+                emotions.append(emotion_data)
+                positions.append(i)
+            
+            # Analyze every text in the chunk in batched forward passes
+            if texts:
+                analyzed = _score_chunk(analyzer.analyze_batch, [text for _, text in texts])
+                for (j, _), emotion_data in zip(texts, analyzed):
+                    if 'error' not in emotion_data:
+                        emotions[j] = emotion_data
+            
+            if students:
+                scored = _score_chunk(
+                    lambda rows: predictor.predict_batch([student for student, _ in rows],
+                                                         [emotion for _, emotion in rows]),
+                    list(zip(students, emotions))
+                )
+                for i, result in zip(positions, scored):
+                    if 'error' in result:
+                        lines[i] = {'index': start + i, 'success': False, 'error': result['error']}
+                    else:
+                        lines[i] = {
+                            'index': start + i,
+                            'success': True,
+                            'risk_score': result['risk_score'],
+                            'risk_category': result['risk_category'],
+                            'explanation': result['explanation'],
+                            'risk_probabilities': result.get('risk_probabilities', {}),
+                            'backend': result.get('backend'),
+                            'latency_ms': result.get('latency_ms')
+                        }
+            
+            yield from lines
+    
+    return _ndjson_response(generate())
+
+def get_feature_store():
+    """This process's StudentFeatureStore, created on first use (imports NumPy)"""
+    global feature_store
+    if feature_store is None:
+        with feature_store_lock:
+            if feature_store is None:
+                from feature_store import StudentFeatureStore
+                feature_store = StudentFeatureStore()
+    return feature_store
+
+def predict_cohort_dropout(student_ids=None, conn=None, predictor=None, use_cache=True):
+    """
+    ML dropout risk from server-side features for every student or the given ids
+    One feature matrix from the store (refreshing only changed students)
+    plus one predict_batch call for the students without a cached result
+    Args:
+        student_ids: iterable of student ids, or None for every student
+        conn: optional open connection to reuse
+        predictor: defaults to the app's dropout predictor
+        use_cache: reuse results cached for the same data whose producing
+                   backend still holds the same model version
+    Returns: dict of student_id -> prediction result with the student's
+    'data_version', 'features' and 'cached'; unknown ids are left out
+    """
+    predictor = predictor or dropout_predictor
+    if predictor is None:
+        raise RuntimeError('Dropout predictor not initialized')
+    
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db()
+    try:
+        ids, X, versions, expires = get_feature_store().matrix(conn, student_ids)
+    finally:
+        if own_conn:
+            conn.close()
+    
+    from feature_store import FEATURE_NAMES
+    # A cached result stays valid while the backend that produced it still
+    # serves the same model version, whichever backend this call would pick
+    model_versions = predictor.model_versions
+    now = time.time()
+    results = {}
+    missing = []
+    for row, (student_id, version) in enumerate(zip(ids.tolist(), versions.tolist())):
+        cached = dropout_result_cache.get(student_id) if use_cache else None
+        if cached and now < cached[1]:
+            data_version, backend, model_version = cached[0]
+            if data_version == version and model_versions.get(backend) == model_version:
+                results[student_id] = dict(cached[2], cached=True)
+                continue
+        missing.append(row)
+    
+    if missing:
+        for row, result in zip(missing, predictor.predict_batch(X[missing])):
+            student_id = int(ids[row])
+            result['data_version'] = int(versions[row])
+            result['features'] = dict(zip(FEATURE_NAMES, X[row].tolist()))
+            # predict_batch tags the producing backend; a bare DropoutRiskPredictor has just one
+            backend = result.get('backend') or next(iter(model_versions))
+            if 'error' not in result:
+                dropout_result_cache[student_id] = (
+                    (int(versions[row]), backend, result.get('model_version', model_versions[backend])),
+                    float(expires[row]), result
+                )
+            results[student_id] = dict(result, cached=False)
+    
+    # Same order as the feature store returned the ids
+    return {int(student_id): results[int(student_id)] for student_id in ids}
+
+@app.cli.command('score-cohort')
+def score_cohort_command():
+    """Score every student with the dropout model from stored data"""
+    global dropout_predictor
+    get_db().close()
+    dropout_predictor = build_dropout_predictor()
+    
+    started = time.perf_counter()
+    results = predict_cohort_dropout(use_cache=False)
+    elapsed = time.perf_counter() - started
+    
+    counts = {}
+    for result in results.values():
+        counts[result['risk_category']] = counts.get(result['risk_category'], 0) + 1
+    click.echo(f"Scored {len(results)} students in {elapsed * 1000:.1f} ms: {counts}")
+
+def _dropout_prediction_json(student_id, result):
+    """Response fields for one server-side dropout prediction"""
+    prediction = {
+        'student_id': student_id,
+        'risk_score': result['risk_score'],
+        'risk_category': result['risk_category'],
+        'explanation': result['explanation'],
+        'risk_probabilities': result.get('risk_probabilities', {}),
+        'backend': result.get('backend'),
+        'model_version': result.get('model_version'),
+        'latency_ms': result.get('latency_ms'),
+        'data_version': result['data_version'],
+        'cached': result['cached'],
+        'features': result['features']
+    }
+    if 'error' in result:
+        prediction['error'] = result['error']
+    return prediction
+
+def _dropout_unavailable():
+    """503 response while the dropout model is loading or missing, else None"""
+    if ai_models_loading:
+        return jsonify({
+            'success': False,
+            'error': 'AI models are still loading. Please try again in a moment.'
+        }), 503
+    if not dropout_predictor:
+        return jsonify({
+            'success': False,
+            'error': 'Dropout predictor not initialized'
+        }), 503
+    return None
+
+@app.route('/predict_dropout/<int:student_id>')
+def predict_dropout_for_student(student_id):
+    """
+    Predict dropout risk for a stored student from server-side features
+    Students may request their own id, counselors any id. The result is
+    cached until the student's data (or the model) changes.
+    Returns: { "success": true, "student_id": 3, "risk_score": ..., "risk_category": ...,
+               "data_version": 12, "cached": true, "features": {...}, ... }
+    """
+    user_type = session.get('user_type')
+    if 'user_id' not in session or not (
+        user_type == 'counselor' or (user_type == 'student' and session['user_id'] == student_id)
+    ):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    unavailable = _dropout_unavailable()
+    if unavailable:
+        return unavailable
+    
+    try:
+        results = predict_cohort_dropout([student_id])
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    if student_id not in results:
+        return jsonify({'success': False, 'error': 'Student not found'}), 404
+    
+    return jsonify({'success': True, **_dropout_prediction_json(student_id, results[student_id])})
+
+COHORT_PREDICTION_MAX = 5000
+
+@app.route('/predict_dropout/cohort')
+def predict_dropout_cohort():
+    """
+    ML dropout risk for a counselor's students in one call, highest risk first
+    Query params:
+        department, semester: exact match filters
+        risk_category: high / moderate / low
+        ids: comma-separated student ids
+        limit: maximum students returned (default and max 5000)
+    Returns: { "success": true, "students": [...], "count": 42, "cached": 40 }
+    """
+    if 'user_id' not in session or session.get('user_type') != 'counselor':
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    try:
+        limit = min(max(int(request.args.get('limit', COHORT_PREDICTION_MAX)), 1), COHORT_PREDICTION_MAX)
+        semester = request.args.get('semester')
+        semester = int(semester) if semester else None
+        ids_arg = request.args.get('ids', '').strip()
+        student_ids = [int(part) for part in ids_arg.split(',') if part.strip()] if ids_arg else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit, semester or ids'}), 400
+    
+    risk_category = request.args.get('risk_category')
+    if risk_category and risk_category not in ('high', 'moderate', 'low'):
+        return jsonify({'success': False, 'error': 'Invalid risk_category'}), 400
+    
+    unavailable = _dropout_unavailable()
+    if unavailable:
+        return unavailable
+    
+    conditions = []
+    params = []
+    if request.args.get('department'):
+        conditions.append('department = ?')
+        params.append(request.args['department'])
+    if semester is not None:
+        conditions.append('semester = ?')
+        params.append(semester)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT id, name, roll_number, department, semester FROM students {where}', params)
+        students = {row['id']: dict(row) for row in cursor.fetchall()}
+        if student_ids is not None:
+            students = {sid: students[sid] for sid in dict.fromkeys(student_ids) if sid in students}
+        results = predict_cohort_dropout(list(students), conn)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+    
+    predictions = [
+        {**students[student_id], **_dropout_prediction_json(student_id, result)}
+        for student_id, result in results.items()
+        if not risk_category or result['risk_category'] == risk_category
+    ]
+    predictions.sort(key=lambda p: (p['risk_score'], p['student_id']), reverse=True)
+    predictions = predictions[:limit]
+    
+    return jsonify({
+        'success': True,
+        'students': predictions,
+        'count': len(predictions),
+        'cached': sum(1 for p in predictions if p['cached'])
+    })
+
+def load_outcome_labels(conn, labels_csv=None):
+    """
+    Recorded outcomes keyed by student id
+    Args:
+        conn: open connection
+        labels_csv: CSV with an 'outcome' column and a 'student_id' or
+                    'roll_number' column; None reads the student_outcomes table
+    Returns: dict of student_id -> outcome as recorded
+    """
+    if labels_csv is None:
+        rows = conn.execute('SELECT student_id, outcome FROM student_outcomes').fetchall()
+        return {row['student_id']: row['outcome'] for row in rows}
+    
+    import csv
+    roll_numbers = {row['roll_number']: row['id'] for row in conn.execute('SELECT id, roll_number FROM students')}
+    outcomes = {}
+    with open(labels_csv, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            if row.get('student_id'):
+                student_id = int(row['student_id'])
+            elif row.get('roll_number') in roll_numbers:
+                student_id = roll_numbers[row['roll_number']]
+            else:
+                raise click.ClickException(f"{labels_csv}:{line}: no known student_id or roll_number")
+            outcomes[student_id] = row['outcome']
+    return outcomes
+
+@app.cli.command('train-dropout-model')
+@click.option('--labels-csv', type=click.Path(exists=True, dir_okay=False), help='Outcome labels CSV (default: the student_outcomes table).')
+@click.option('--folds', default=5, show_default=True, help='Cross-validation folds.')
+@click.option('--jobs', type=int, default=None, help='Worker processes [default: all cores].')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Artifact file [default: DROPOUT_MODEL_ARTIFACT or the default RandomForest artifact].')
+def train_dropout_model_command(labels_csv, folds, jobs, output):
+    """Train the dropout model on recorded outcomes with parallel cross-validation"""
+    from feature_store import fetch_student_features, FEATURE_NAMES
+    from ai_models.training import outcome_label, train_dropout_model
+    import numpy as np
+    
+    conn = get_db()
+    outcomes = load_outcome_labels(conn, labels_csv)
+    columns = fetch_student_features(conn, list(outcomes))
+    conn.close()
+    
+    try:
+        rows = {int(student_id): i for i, student_id in enumerate(columns['student_id'])}
+        labelled = [student_id for student_id in outcomes if student_id in rows]
+        y = np.array([outcome_label(outcomes[student_id]) for student_id in labelled], dtype=int)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    skipped = len(outcomes) - len(labelled)
+    click.echo(f"Training on {len(labelled)} labelled students ({skipped} labels without a student skipped)")
+    
+    order = [rows[student_id] for student_id in labelled]
+    X = np.column_stack([columns[name][order] for name in FEATURE_NAMES])
+    try:
+        manifest = train_dropout_model(
+            X, y, output or os.getenv('DROPOUT_MODEL_ARTIFACT'),
+            n_splits=folds, n_jobs=jobs, label_source=labels_csv or 'student_outcomes'
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Saved {manifest['model_version']}: {manifest['metrics']}")
+    click.echo(f"Best hyperparameters: {manifest['training']['hyperparameters']}")
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """
@@ -1161,7 +2615,7 @@ def chat():
         def generate():
             try:
                 # Initialize Gemini model
-                model = genai.GenerativeModel('gemini-2.0-flash')
+                model = get_genai().GenerativeModel('gemini-2.0-flash')
                 
                 # Create chat with system prompt
                 chat = model.start_chat(history=[
@@ -1211,14 +2665,81 @@ def chat():
             'error': str(e)
         }), 500
 
+def _check_database():
+    """
+    Time a real query against the database
+    
+    Returns:
+        tuple: (ok, round-trip milliseconds, error message or None)
+    """
+    started = time.perf_counter()
+    try:
+        conn = get_db()
+        conn.execute('SELECT id FROM students LIMIT 1').fetchone()
+        conn.close()
+        return True, round((time.perf_counter() - started) * 1000, 2), None
+    except Exception as e:
+        return False, round((time.perf_counter() - started) * 1000, 2), str(e)
+
 @app.route('/health')
 def health():
-    """Health check endpoint for deployment platforms"""
-    return jsonify({
-        'status': 'healthy',
-        'ai_models_loaded': not ai_models_loading,
-        'database': 'connected'
-    }), 200
+    """Liveness check endpoint for deployment platforms (see /ready for readiness)"""
+    db_ok, db_ms, db_error = _check_database()
+    status = {
+        'status': 'healthy' if db_ok else 'degraded',
+        'ai_models_loaded': emotion_analyzer is not None and dropout_predictor is not None,
+        'ai_models': dict(ai_model_status),
+        'ai_models_preloaded': ai_models_preloaded,
+        'database': 'connected' if db_ok else f'error: {db_error}',
+        'worker_memory': process_memory(),
+        'startup_timings': startup_timings
+    }
+    if emotion_analyzer and emotion_analyzer.cache is not None:
+        status['emotion_cache'] = emotion_analyzer.cache.stats()
+    if dropout_predictor is not None:
+        status['dropout_backends'] = dropout_predictor.stats()
+    if feature_store is not None:
+        status['feature_store'] = dict(feature_store.stats(), cached_predictions=len(dropout_result_cache))
+    return jsonify(status), 200
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness check: 200 once this worker can serve traffic, 503 until then
+    
+    A worker is ready when the database answers and no enabled model is
+    still loading or warming up. Models that failed to load are reported
+    but do not hold the worker back, since the app runs without them.
+    """
+    db_ok, db_ms, db_error = _check_database()
+    models = {
+        name: {'status': state, **warmup_latencies.get(name, {})}
+        for name, state in ai_model_status.items()
+    }
+    if dropout_predictor is not None:
+        models['dropout']['version'] = dropout_predictor.model_version
+    is_ready = db_ok and not any(
+        state in ('loading', 'warming_up') for state in ai_model_status.values()
+    )
+    
+    status = {
+        'ready': is_ready,
+        'pid': os.getpid(),
+        'models': models,
+        'database': {'ok': db_ok, 'round_trip_ms': db_ms}
+    }
+    if db_error:
+        status['database']['error'] = db_error
+    return jsonify(status), 200 if is_ready else 503
+
+@app.before_request
+def record_first_request():
+    """Close the startup timing report when the first request arrives"""
+    if 'first_request' not in startup_timings:
+        record_startup_phase('first_request', _startup_began)
+        print(f"Startup timings (seconds): {startup_timings}")
+
+record_startup_phase('app_import', _startup_began)
 
 if __name__ == '__main__':
     # Use /tmp on Render for database if available
@@ -2,6 +2,7 @@ import sqlite3
 import os
 from datetime import datetime, timedelta
 import random
+from migrations import apply_migrations
 
 def create_database(db_path='instance/ira.db'):
     """Create the database and initialize tables with sample data"""
@@ -229,6 +230,9 @@ def create_database(db_path='instance/ira.db'):
         ''', (student_id,))
     
     conn.commit()
+    
+    # Bring the new database up to the latest schema version
+    apply_migrations(conn)
     conn.close()
     
     print(f"✅ Database created successfully at {db_path}!")
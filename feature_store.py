@@ -0,0 +1,298 @@
+"""
+Columnar store of dropout model features computed from the database
+
+Builds the 10-feature matrix DropoutRiskPredictor expects for every student
+(or a subset) with one aggregate query over students, attendance, moods,
+activities and journal_emotions, and keeps it in memory as one NumPy column
+per feature indexed by student_id. Writes to any source table bump the
+student's row in student_feature_versions (migration 6), so refresh()
+reloads only the students that changed since the last sync, or whose
+rolling windows have moved on.
+"""
+
+import json
+import threading
+import time
+
+import numpy as np
+
+from ai_models.synthetic_data import FEATURE_NAMES
+
+# Values used when a student has no rows in a window, matching the
+# predictor's defaults for missing inputs. activities_per_week is only
+# defaulted when a student has logged no activities at all (nothing is
+# known); logged days under ACTIVE_DAY_MINUTES count as 0 active days.
+FEATURE_DEFAULTS = {
+    'cgpa': 7.0,
+    'attendance_percentage': 85.0,
+    'mood_score': 6.5,
+    'activities_per_week': 3.0,
+    'semester': 4.0,
+}
+
+# A day in activities counts towards activities_per_week from this much exercise
+ACTIVE_DAY_MINUTES = 20
+
+# Attendance over all months; mood over the last 7 days and activity days
+# over the 7 calendar days ending today;
+# emotion scores averaged over journal entries of the last 30 days. Each
+# window also reports when its oldest row drops out (Unix seconds).
+# {only} restricts every aggregate to the ids in the :ids JSON array, so a
+# partial refresh reads only those students' rows.
+STUDENT_FEATURES_QUERY = f'''
+    SELECT s.id, s.cgpa, s.fee_pending, s.semester,
+           a.avg_attendance, m.avg_mood, m.mood_expires_at,
+           act.active_days, act.activity_expires_at,
+           e.joy, e.sadness, e.anger, e.fear, e.emotion_expires_at,
+           COALESCE(v.version, 0) as version
+    FROM students s
+    LEFT JOIN (
+        SELECT student_id, AVG(attendance_percentage) as avg_attendance
+        FROM attendance
+        WHERE attendance_percentage IS NOT NULL {{only}}
+        GROUP BY student_id
+    ) a ON a.student_id = s.id
+    LEFT JOIN (
+        SELECT student_id, AVG(mood_score) as avg_mood,
+               CAST(strftime('%s', MIN(created_at), '+7 days') AS INTEGER) as mood_expires_at
+        FROM moods
+        WHERE created_at >= datetime('now', '-7 days') {{only}}
+        GROUP BY student_id
+    ) m ON m.student_id = s.id
+    LEFT JOIN (
+        SELECT student_id,
+               COUNT(DISTINCT CASE WHEN exercise_minutes >= {ACTIVE_DAY_MINUTES} THEN date END) as active_days,
+               CAST(strftime('%s', MIN(date), '+7 days') AS INTEGER) as activity_expires_at
+        FROM activities
+        WHERE date >= date('now', '-6 days') {{only}}
+        GROUP BY student_id
+    ) act ON act.student_id = s.id
+    LEFT JOIN (
+        SELECT je.student_id,
+               TOTAL(CASE WHEN json_extract(x.value, '$.emotion') = 'joy'
+                     THEN json_extract(x.value, '$.score') END) / COUNT(DISTINCT je.journal_id) as joy,
+               TOTAL(CASE WHEN json_extract(x.value, '$.emotion') = 'sadness'
+                     THEN json_extract(x.value, '$.score') END) / COUNT(DISTINCT je.journal_id) as sadness,
+               TOTAL(CASE WHEN json_extract(x.value, '$.emotion') = 'anger'
+                     THEN json_extract(x.value, '$.score') END) / COUNT(DISTINCT je.journal_id) as anger,
+               TOTAL(CASE WHEN json_extract(x.value, '$.emotion') = 'fear'
+                     THEN json_extract(x.value, '$.score') END) / COUNT(DISTINCT je.journal_id) as fear,
+               CAST(strftime('%s', MIN(j.created_at), '+30 days') AS INTEGER) as emotion_expires_at
+        FROM journal_emotions je
+        JOIN journals j ON j.id = je.journal_id
+        LEFT JOIN json_each(je.all_emotions) x
+        WHERE j.created_at >= datetime('now', '-30 days') {{only_je}}
+        GROUP BY je.student_id
+    ) e ON e.student_id = s.id
+    LEFT JOIN student_feature_versions v ON v.student_id = s.id
+'''
+
+ALL_STUDENTS_QUERY = STUDENT_FEATURES_QUERY.format(only='', only_je='')
+SELECTED_STUDENTS_QUERY = STUDENT_FEATURES_QUERY.format(
+    only='AND student_id IN (SELECT value FROM json_each(:ids))',
+    only_je='AND je.student_id IN (SELECT value FROM json_each(:ids))'
+) + ' WHERE s.id IN (SELECT value FROM json_each(:ids))'
+
+
+def _nan_to(values, default):
+    return np.where(np.isnan(values), default, values)
+
+
+def fetch_student_features(conn, student_ids=None):
+    """
+    Compute feature columns straight from the database
+
+    Args:
+        conn: open connection
+        student_ids: iterable of student ids, or None for every student
+
+    Returns:
+        dict: 'student_id', 'version' and 'expires_at' arrays plus one
+              float column per name in FEATURE_NAMES, rows in the same order
+    """
+    if student_ids is None:
+        rows = conn.execute(ALL_STUDENTS_QUERY).fetchall()
+    else:
+        ids = json.dumps([int(sid) for sid in student_ids])
+        rows = conn.execute(SELECTED_STUDENTS_QUERY, {'ids': ids}).fetchall()
+
+    def column(index):
+        # None -> nan in one conversion
+        return np.array([row[index] for row in rows], dtype=float).reshape(-1)
+
+    cgpa, fee, semester, attendance, mood, mood_expires = (column(i) for i in range(1, 7))
+    active_days, activity_expires = column(7), column(8)
+    emotions = [column(i) for i in range(9, 13)]
+    emotion_expires = column(13)
+
+    columns = {
+        'student_id': np.array([row[0] for row in rows], dtype=np.int64).reshape(-1),
+        'version': np.array([row[14] for row in rows], dtype=np.int64).reshape(-1),
+        # Earliest moment a rolling window changes without any write; inf if never
+        'expires_at': _nan_to(np.fmin(np.fmin(mood_expires, activity_expires), emotion_expires), np.inf),
+        'cgpa': _nan_to(cgpa, FEATURE_DEFAULTS['cgpa']),
+        'attendance_percentage': _nan_to(attendance, FEATURE_DEFAULTS['attendance_percentage']),
+        'fee_pending': (_nan_to(fee, 0.0) != 0).astype(float),
+        'mood_score': _nan_to(mood, FEATURE_DEFAULTS['mood_score']),
+        'activities_per_week': _nan_to(active_days, FEATURE_DEFAULTS['activities_per_week']),
+        'semester': _nan_to(semester, FEATURE_DEFAULTS['semester']),
+    }
+    for name, values in zip(FEATURE_NAMES[5:9], emotions):
+        columns[name] = _nan_to(values, 0.0)
+    return columns
+
+
+class StudentFeatureStore:
+    """
+    In-memory feature columns for every student, kept in sync with the database
+    """
+
+    def __init__(self):
+        self.columns = None
+        self._index = {}  # student_id -> row
+        self.synced_version = 0
+        self.last_refresh = None
+        self.full_builds = 0
+        self.rows_reloaded = 0
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def build(self, conn):
+        """
+        Load every student's features, replacing what is held
+
+        Returns:
+            int: number of students loaded
+        """
+        # Read the high-water mark first so writes racing the load are
+        # picked up by the next refresh instead of lost
+        synced = self._max_version(conn)
+        columns = fetch_student_features(conn)
+        with self._lock:
+            self.columns = columns
+            self._index = {int(sid): i for i, sid in enumerate(columns['student_id'])}
+            self.synced_version = synced
+            self.last_refresh = time.time()
+            self.full_builds += 1
+            self._pending.clear()
+        return len(columns['student_id'])
+
+    @staticmethod
+    def _max_version(conn):
+        row = conn.execute('SELECT MAX(version) FROM student_feature_versions').fetchone()
+        return row[0] or 0
+
+    def invalidate(self, student_ids):
+        """Reload these students on the next refresh()"""
+        with self._lock:
+            self._pending.update(int(sid) for sid in student_ids)
+
+    def refresh(self, conn):
+        """
+        Reload students whose data changed since the last sync or whose
+        rolling windows have expired; builds everything the first time
+
+        Returns:
+            int: number of students reloaded
+        """
+        if self.columns is None:
+            return self.build(conn)
+
+        synced = self._max_version(conn)
+        with self._lock:
+            changed = set(self._pending)
+            self._pending.clear()
+            previous = self.synced_version
+            expired = self.columns['student_id'][self.columns['expires_at'] <= time.time()]
+        changed.update(int(sid) for sid in expired)
+        if synced > previous:
+            changed.update(
+                row[0] for row in conn.execute(
+                    'SELECT student_id FROM student_feature_versions WHERE version > ? AND version <= ?',
+                    (previous, synced)
+                )
+            )
+        if changed:
+            self._apply(sorted(changed), fetch_student_features(conn, changed))
+        with self._lock:
+            self.synced_version = max(self.synced_version, synced)
+            self.last_refresh = time.time()
+            self.rows_reloaded += len(changed)
+        return len(changed)
+
+    def _apply(self, student_ids, fresh):
+        """Overwrite, append or drop (deleted students) the given rows"""
+        with self._lock:
+            columns = self.columns
+            fresh_rows = {int(sid): i for i, sid in enumerate(fresh['student_id'])}
+            existing = [sid for sid in student_ids if sid in self._index and sid in fresh_rows]
+            added = [sid for sid in student_ids if sid not in self._index and sid in fresh_rows]
+            removed = [sid for sid in student_ids if sid in self._index and sid not in fresh_rows]
+
+            if existing:
+                rows = [self._index[sid] for sid in existing]
+                source = [fresh_rows[sid] for sid in existing]
+                for name, values in columns.items():
+                    values[rows] = fresh[name][source]
+            if added or removed:
+                keep = np.ones(len(columns['student_id']), dtype=bool)
+                keep[[self._index[sid] for sid in removed]] = False
+                source = [fresh_rows[sid] for sid in added]
+                columns = {
+                    name: np.concatenate([values[keep], fresh[name][source]])
+                    for name, values in columns.items()
+                }
+                self.columns = columns
+                self._index = {int(sid): i for i, sid in enumerate(columns['student_id'])}
+
+    def matrix(self, conn, student_ids=None):
+        """
+        Feature matrix for every student or the given ids, after a refresh
+
+        Args:
+            conn: open connection
+            student_ids: iterable of student ids, or None for every student
+
+        Returns:
+            tuple: (ids, X, versions, expires_at) with X of shape
+                   (len(ids), 10) in FEATURE_NAMES order, each student's data
+                   version and when its rolling windows next move (Unix
+                   seconds, inf if never); unknown ids are left out
+        """
+        self.refresh(conn)
+        with self._lock:
+            columns = self.columns
+            if student_ids is None:
+                rows = np.arange(len(columns['student_id']))
+            else:
+                rows = np.array(
+                    [self._index[sid] for sid in dict.fromkeys(student_ids) if sid in self._index],
+                    dtype=np.intp
+                )
+            X = np.empty((len(rows), len(FEATURE_NAMES)))
+            for j, name in enumerate(FEATURE_NAMES):
+                X[:, j] = columns[name][rows]
+            return (columns['student_id'][rows].copy(), X, columns['version'][rows].copy(),
+                    columns['expires_at'][rows].copy())
+
+    def features(self, conn, student_id):
+        """
+        One student's features as a dict of FEATURE_NAMES plus 'version', or None if unknown
+        """
+        ids, X, versions, _ = self.matrix(conn, [student_id])
+        if not len(ids):
+            return None
+        features = dict(zip(FEATURE_NAMES, X[0].tolist()))
+        features['fee_pending'] = bool(features['fee_pending'])
+        features['version'] = int(versions[0])
+        return features
+
+    def stats(self):
+        with self._lock:
+            return {
+                'students': 0 if self.columns is None else len(self.columns['student_id']),
+                'synced_version': self.synced_version,
+                'full_builds': self.full_builds,
+                'rows_reloaded': self.rows_reloaded,
+                'last_refresh': self.last_refresh
+            }
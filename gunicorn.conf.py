@@ -0,0 +1,55 @@
+"""
+Gunicorn settings (read automatically from the working directory)
+
+Workers are gevent workers by default: an open /notifications/stream is
+an idle greenlet rather than a request thread, so one worker holds
+hundreds of streams and they never starve normal requests. AI model calls
+are moved to native threads (model_offload.py) so inference does not stall
+the event loop. Set GUNICORN_WORKER_CLASS=gthread to fall back to threads.
+
+With PRELOAD_AI_MODELS=true the app and its AI models are loaded once in
+the master process, and workers share the model weights copy-on-write
+instead of each holding a copy. Otherwise every worker loads its own
+models in a background thread after it boots.
+
+Check the saving with GET /health, which reports the answering worker's
+rss/pss/shared/private memory.
+"""
+
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    # Patch before the app (and its locks and queues) is imported, so a
+    # preloaded app uses gevent primitives too. aggressive=False keeps
+    # select.epoll, which huggingface_hub's HTTP dependencies (trio) read
+    # at import time; selectors is still patched.
+    from gevent import monkey
+    monkey.patch_all(aggressive=False)
+
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+threads = 8  # Only used by the gthread fallback
+
+preload_app = os.getenv('PRELOAD_AI_MODELS', '').lower() == 'true'
+
+
+def when_ready(server):
+    """Runs in the master before the first worker is forked"""
+    if preload_app:
+        import app
+        app.preload_ai_models()
+
+
+def post_worker_init(worker):
+    """Runs in each worker once the app is imported"""
+    if worker_class == 'gevent':
+        # The gevent worker patches again, aggressively, before this hook
+        import select
+        select.epoll = monkey.get_original('select', 'epoll')
+    import app
+    # The int8 parity check runs inference, so only the first worker does it
+    parity_check = worker.age == 1
+    if preload_app:
+        app.init_forked_worker(parity_check=parity_check)
+    else:
+        app.initialize_ai_models_background(parity_check=parity_check)
@@ -0,0 +1,156 @@
+"""
+Background emotion enrichment of journal entries
+
+A worker thread finds journal rows with no journal_emotions row for the
+current model, runs the emotion model over them in batches, and stores the
+primary emotion, its score and the full distribution. Page loads and risk
+scoring then read precomputed emotion features instead of running the
+transformer inside a request. Entries that fail analysis are recorded in
+journal_emotion_failures and skipped after max_attempts tries.
+"""
+
+import json
+import threading
+
+
+class JournalEmotionWorker:
+    """
+    Batches pending journal entries through an EmotionAnalyzer
+    """
+
+    def __init__(self, connect, analyzer, batch_size=32, poll_interval=30.0, max_attempts=3):
+        """
+        Args:
+            connect: callable returning a new database connection
+            analyzer: loaded EmotionAnalyzer
+            batch_size: journal entries analyzed per model call
+            poll_interval: seconds between checks for rows written by other workers
+            max_attempts: failed analyses of one entry before it is skipped
+        """
+        self._connect = connect
+        self.analyzer = analyzer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def model_version(self):
+        return self.analyzer.model_id
+
+    def start(self):
+        """Start the background thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def notify(self):
+        """Wake the worker after a journal entry is written"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                while self.process_pending() == self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Journal emotion worker error: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def process_pending(self, limit=None, reanalyze=False):
+        """
+        Analyze one batch of journal entries that lack current emotion results
+
+        Entries that already failed max_attempts times with the current model
+        are left out, so one entry the model cannot handle does not block the
+        ones after it.
+
+        Args:
+            limit: rows to take (defaults to batch_size)
+            reanalyze: also pick up rows analyzed by a different model version
+
+        Returns:
+            int: number of journal entries processed, enriched or recorded as failed
+        """
+        limit = limit or self.batch_size
+        conn = self._connect()
+        try:
+            if reanalyze:
+                condition = '(je.journal_id IS NULL OR je.model_version != ?)'
+                params = (self.model_version, self.model_version, self.max_attempts, limit)
+            else:
+                condition = 'je.journal_id IS NULL'
+                params = (self.model_version, self.max_attempts, limit)
+            rows = conn.execute(f'''
+                SELECT j.id, j.student_id, j.content
+                FROM journals j
+                LEFT JOIN journal_emotions je ON je.journal_id = j.id
+                WHERE {condition}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM journal_emotion_failures f
+                      WHERE f.journal_id = j.id AND f.model_version = ? AND f.attempts >= ?
+                  )
+                ORDER BY j.id
+                LIMIT ?
+            ''', params).fetchall()
+
+            if not rows:
+                return 0
+
+            results = self._analyze([row[2] for row in rows])
+
+            records = []
+            failures = []
+            for row, result in zip(rows, results):
+                if result.get('emotion') == 'error':
+                    failures.append((row[0], self.model_version, str(result.get('error', ''))[:500]))
+                    continue
+                records.append((
+                    row[0], row[1], result['emotion'], result['score'],
+                    json.dumps(result['all_emotions']), self.model_version
+                ))
+
+            conn.executemany('''
+                INSERT OR REPLACE INTO journal_emotions
+                    (journal_id, student_id, emotion, score, all_emotions, model_version, analyzed_at)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ''', records)
+            conn.executemany(
+                'DELETE FROM journal_emotion_failures WHERE journal_id = ?',
+                [(record[0],) for record in records]
+            )
+            # Attempts restart from 1 when the model version changes
+            conn.executemany('''
+                INSERT INTO journal_emotion_failures (journal_id, model_version, attempts, last_error)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (journal_id) DO UPDATE SET
+                    attempts = CASE WHEN model_version = excluded.model_version
+                                    THEN attempts + 1 ELSE 1 END,
+                    model_version = excluded.model_version,
+                    last_error = excluded.last_error,
+                    last_attempt_at = CURRENT_TIMESTAMP
+            ''', failures)
+            conn.commit()
+
+            if failures:
+                print(f"Journal emotion worker: {len(failures)} entries failed analysis "
+                      f"(skipped after {self.max_attempts} attempts): {[f[0] for f in failures]}")
+            return len(rows)
+        finally:
+            conn.close()
+
+    def _analyze(self, texts):
+        """Analyze a batch, falling back to one entry at a time if the batch call raises"""
+        try:
+            return self.analyzer.analyze_batch(texts)
+        except Exception as e:
+            print(f"Journal emotion batch failed ({e}); analyzing entries one at a time")
+        results = []
+        for text in texts:
+            try:
+                results.append(self.analyzer.analyze_batch([text])[0])
+            except Exception as e:
+                results.append({'emotion': 'error', 'error': str(e)})
+        return results
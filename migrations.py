@@ -0,0 +1,424 @@
+"""
+Versioned schema migrations for the IRA database
+
+Each migration is applied once, in order, and recorded in schema_version.
+Statements are idempotent (IF NOT EXISTS) so existing ira.db files created
+before a migration existed upgrade in place without losing data.
+"""
+
+import sqlite3
+
+# Materialized risk per student, kept current by refresh_student_risk() in app.py.
+# Triggers flag rows stale whenever an input changes so any writer (including
+# bulk imports that bypass the app) invalidates the cached score.
+STUDENT_RISK_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS student_risk (
+    student_id INTEGER PRIMARY KEY,
+    risk_level TEXT NOT NULL,
+    risk_score INTEGER NOT NULL,
+    factors TEXT NOT NULL,
+    stale BOOLEAN DEFAULT 0,
+    expires_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(id)
+);
+
+CREATE TRIGGER IF NOT EXISTS student_risk_moods_insert AFTER INSERT ON moods BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id = NEW.student_id;
+END;
+CREATE TRIGGER IF NOT EXISTS student_risk_moods_update AFTER UPDATE ON moods BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id IN (OLD.student_id, NEW.student_id);
+END;
+CREATE TRIGGER IF NOT EXISTS student_risk_moods_delete AFTER DELETE ON moods BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id = OLD.student_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_risk_attendance_insert AFTER INSERT ON attendance BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id = NEW.student_id;
+END;
+CREATE TRIGGER IF NOT EXISTS student_risk_attendance_update AFTER UPDATE ON attendance BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id IN (OLD.student_id, NEW.student_id);
+END;
+CREATE TRIGGER IF NOT EXISTS student_risk_attendance_delete AFTER DELETE ON attendance BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id = OLD.student_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_risk_students_update AFTER UPDATE OF cgpa, fee_pending ON students BEGIN
+    UPDATE student_risk SET stale = 1 WHERE student_id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS student_risk_students_delete AFTER DELETE ON students BEGIN
+    DELETE FROM student_risk WHERE student_id = OLD.id;
+END;
+'''
+
+# Indexes matched to the queries app.py runs
+QUERY_INDEXES_SCHEMA = '''
+-- Recent moods per student and the 7-day mood window (covers AVG(mood_score))
+CREATE INDEX IF NOT EXISTS idx_moods_student_created
+    ON moods (student_id, created_at, mood_score);
+
+-- Journals and activities listed per student, newest first
+CREATE INDEX IF NOT EXISTS idx_journals_student_created
+    ON journals (student_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_activities_student_date
+    ON activities (student_id, date);
+
+-- Attendance per student (covers AVG(attendance_percentage))
+CREATE INDEX IF NOT EXISTS idx_attendance_student
+    ON attendance (student_id, attendance_percentage);
+
+-- Upcoming meetings on the counselor dashboard
+CREATE INDEX IF NOT EXISTS idx_meetings_status_scheduled
+    ON meetings (status, scheduled_at);
+
+-- Notification list per user, and a partial index for the unread badge
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created
+    ON notifications (user_id, user_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread
+    ON notifications (user_id, user_type) WHERE is_read = 0;
+'''
+
+# Keyset pagination of the counselor student list by (risk_score, student_id)
+STUDENT_RISK_ORDER_SCHEMA = '''
+CREATE INDEX IF NOT EXISTS idx_student_risk_score
+    ON student_risk (risk_score, student_id);
+'''
+
+# Recompute every unread counter from the notifications table
+NOTIFICATION_COUNTERS_REBUILD = '''
+DELETE FROM notification_counters;
+INSERT INTO notification_counters (user_id, user_type, unread_count)
+    SELECT user_id, user_type, COUNT(*)
+    FROM notifications
+    WHERE is_read = 0
+    GROUP BY user_id, user_type;
+'''
+
+# Unread notification count per user, maintained by triggers in the same
+# transaction as the notification write so the badge is a single-row lookup
+NOTIFICATION_COUNTERS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id INTEGER NOT NULL,
+    user_type TEXT NOT NULL,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, user_type)
+);
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_insert
+AFTER INSERT ON notifications WHEN NEW.is_read = 0 BEGIN
+    INSERT INTO notification_counters (user_id, user_type, unread_count)
+    VALUES (NEW.user_id, NEW.user_type, 1)
+    ON CONFLICT (user_id, user_type) DO UPDATE SET unread_count = unread_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_update_old
+AFTER UPDATE OF is_read, user_id, user_type ON notifications WHEN OLD.is_read = 0 BEGIN
+    UPDATE notification_counters SET unread_count = unread_count - 1
+    WHERE user_id = OLD.user_id AND user_type = OLD.user_type;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_update_new
+AFTER UPDATE OF is_read, user_id, user_type ON notifications WHEN NEW.is_read = 0 BEGIN
+    INSERT INTO notification_counters (user_id, user_type, unread_count)
+    VALUES (NEW.user_id, NEW.user_type, 1)
+    ON CONFLICT (user_id, user_type) DO UPDATE SET unread_count = unread_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS notification_counters_delete
+AFTER DELETE ON notifications WHEN OLD.is_read = 0 BEGIN
+    UPDATE notification_counters SET unread_count = unread_count - 1
+    WHERE user_id = OLD.user_id AND user_type = OLD.user_type;
+END;
+''' + NOTIFICATION_COUNTERS_REBUILD
+
+# Emotion analysis of each journal entry, written by the background
+# enrichment worker; editing or deleting an entry drops its row so the
+# worker picks it up again
+JOURNAL_EMOTIONS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS journal_emotions (
+    journal_id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL,
+    emotion TEXT NOT NULL,
+    score REAL NOT NULL,
+    all_emotions TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    analyzed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (journal_id) REFERENCES journals (id),
+    FOREIGN KEY (student_id) REFERENCES students (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_journal_emotions_student ON journal_emotions(student_id, journal_id);
+
+CREATE TRIGGER IF NOT EXISTS journal_emotions_journal_update
+AFTER UPDATE OF content ON journals BEGIN
+    DELETE FROM journal_emotions WHERE journal_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS journal_emotions_journal_delete
+AFTER DELETE ON journals BEGIN
+    DELETE FROM journal_emotions WHERE journal_id = OLD.id;
+END;
+'''
+
+# Per-student data version for the in-process feature store (feature_store.py).
+# Every write to a feature source gives the student the next value of one
+# global counter, so a store that has seen versions up to N reloads exactly
+# the students with version > N, whichever process made the change.
+STUDENT_FEATURE_VERSIONS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS student_feature_versions (
+    student_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_student_feature_versions_version
+    ON student_feature_versions (version);
+
+CREATE TRIGGER IF NOT EXISTS student_features_moods_insert AFTER INSERT ON moods BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_moods_update AFTER UPDATE ON moods BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_moods_delete AFTER DELETE ON moods BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_features_attendance_insert AFTER INSERT ON attendance BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_attendance_update AFTER UPDATE ON attendance BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_attendance_delete AFTER DELETE ON attendance BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_features_activities_insert AFTER INSERT ON activities BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_activities_update AFTER UPDATE ON activities BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_activities_delete AFTER DELETE ON activities BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_features_journal_emotions_insert AFTER INSERT ON journal_emotions BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_journal_emotions_delete AFTER DELETE ON journal_emotions BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.student_id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS student_features_students_insert AFTER INSERT ON students BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_students_update
+AFTER UPDATE OF cgpa, fee_pending, semester ON students BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (NEW.id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS student_features_students_delete AFTER DELETE ON students BEGIN
+    INSERT INTO student_feature_versions (student_id, version)
+    VALUES (OLD.id, (SELECT COALESCE(MAX(version), 0) + 1 FROM student_feature_versions))
+    ON CONFLICT (student_id) DO UPDATE SET version = excluded.version;
+END;
+'''
+
+# Recorded outcome per student ('dropped_out', 'retained', ... or a 0-2 risk
+# class), the labels for flask train-dropout-model
+STUDENT_OUTCOMES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS student_outcomes (
+    student_id INTEGER PRIMARY KEY,
+    outcome TEXT NOT NULL,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students (id)
+);
+'''
+
+# Per-user change version of notifications, bumped on insert, read-state
+# change and delete so each worker's NotificationHub watcher can wake
+# streams for changes made by other workers with one indexed query
+NOTIFICATION_VERSIONS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS notification_versions (
+    user_id INTEGER NOT NULL,
+    user_type TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (user_id, user_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_notification_versions_version
+    ON notification_versions (version);
+
+CREATE TRIGGER IF NOT EXISTS notification_versions_insert AFTER INSERT ON notifications BEGIN
+    INSERT INTO notification_versions (user_id, user_type, version)
+    VALUES (NEW.user_id, NEW.user_type, (SELECT COALESCE(MAX(version), 0) + 1 FROM notification_versions))
+    ON CONFLICT (user_id, user_type) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS notification_versions_update AFTER UPDATE ON notifications BEGIN
+    INSERT INTO notification_versions (user_id, user_type, version)
+    VALUES (OLD.user_id, OLD.user_type, (SELECT COALESCE(MAX(version), 0) + 1 FROM notification_versions))
+    ON CONFLICT (user_id, user_type) DO UPDATE SET version = excluded.version;
+    INSERT INTO notification_versions (user_id, user_type, version)
+    VALUES (NEW.user_id, NEW.user_type, (SELECT COALESCE(MAX(version), 0) + 1 FROM notification_versions))
+    ON CONFLICT (user_id, user_type) DO UPDATE SET version = excluded.version;
+END;
+CREATE TRIGGER IF NOT EXISTS notification_versions_delete AFTER DELETE ON notifications BEGIN
+    INSERT INTO notification_versions (user_id, user_type, version)
+    VALUES (OLD.user_id, OLD.user_type, (SELECT COALESCE(MAX(version), 0) + 1 FROM notification_versions))
+    ON CONFLICT (user_id, user_type) DO UPDATE SET version = excluded.version;
+END;
+'''
+
+# Journal entries the enrichment worker failed to analyze, per model version.
+# Entries that reach the worker's attempt limit are skipped so they cannot
+# hold up the rows behind them; editing or deleting the entry clears the record
+JOURNAL_EMOTION_FAILURES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS journal_emotion_failures (
+    journal_id INTEGER PRIMARY KEY,
+    model_version TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    last_error TEXT,
+    last_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (journal_id) REFERENCES journals (id)
+);
+
+CREATE TRIGGER IF NOT EXISTS journal_emotion_failures_journal_update
+AFTER UPDATE OF content ON journals BEGIN
+    DELETE FROM journal_emotion_failures WHERE journal_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS journal_emotion_failures_journal_delete
+AFTER DELETE ON journals BEGIN
+    DELETE FROM journal_emotion_failures WHERE journal_id = OLD.id;
+END;
+'''
+
+# Persistent layer of the emotion analysis cache (ai_models/emotion_cache.py),
+# keyed by a hash of the model configuration and normalized text and pruned
+# by created_at
+EMOTION_CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS emotion_cache (
+    cache_key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_emotion_cache_created ON emotion_cache (created_at);
+'''
+
+# Attendance per student in id order, so the student detail views'
+# WHERE student_id = ? ORDER BY id DESC reads the index backwards instead of
+# sorting; attendance_percentage stays in the index to keep covering AVG()
+ATTENDANCE_ORDER_INDEX_SCHEMA = '''
+DROP INDEX IF EXISTS idx_attendance_student;
+CREATE INDEX idx_attendance_student
+    ON attendance (student_id, id, attendance_percentage);
+'''
+
+# (version, description, sql) in the order they must be applied
+MIGRATIONS = [
+    (1, 'student_risk table and invalidation triggers', STUDENT_RISK_SCHEMA),
+    (2, 'secondary indexes for per-student and notification queries', QUERY_INDEXES_SCHEMA),
+    (3, 'student_risk ordering index for counselor list pagination', STUDENT_RISK_ORDER_SCHEMA),
+    (4, 'denormalized unread notification counters', NOTIFICATION_COUNTERS_SCHEMA),
+    (5, 'journal_emotions table for background emotion enrichment', JOURNAL_EMOTIONS_SCHEMA),
+    (6, 'per-student data versions for the feature store', STUDENT_FEATURE_VERSIONS_SCHEMA),
+    (7, 'student_outcomes labels for offline dropout model training', STUDENT_OUTCOMES_SCHEMA),
+    (8, 'per-user notification change versions for cross-worker streams', NOTIFICATION_VERSIONS_SCHEMA),
+    (9, 'failed journal emotion analyses with attempt counts', JOURNAL_EMOTION_FAILURES_SCHEMA),
+    (10, 'emotion_cache table for persistent emotion analysis results', EMOTION_CACHE_SCHEMA),
+    (11, 'attendance index ordered by id for per-student listings', ATTENDANCE_ORDER_INDEX_SCHEMA),
+]
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version, 0 for a fresh database"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn):
+    """
+    Apply every pending migration to an open connection
+    
+    Returns:
+        list: versions that were applied by this call
+    """
+    current = get_schema_version(conn)
+    conn.commit()
+    
+    applied = []
+    for version, description, sql in MIGRATIONS:
+        if version <= current:
+            continue
+        # One transaction per migration: the DDL script opens it and the
+        # version row is inserted with bound parameters before the commit.
+        # INSERT OR IGNORE keeps concurrent workers that race on startup
+        # from failing on the version row
+        try:
+            conn.executescript('BEGIN;\n' + sql)
+            conn.execute(
+                'INSERT OR IGNORE INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied schema migration {version}: {description}")
+    
+    return applied
+
+
+if __name__ == '__main__':
+    import os
+    db_path = '/tmp/ira.db' if os.getenv('RENDER') else 'instance/ira.db'
+    if not os.path.exists(db_path):
+        raise SystemExit(f"No database at {db_path}; run create_database.py first")
+    conn = sqlite3.connect(db_path)
+    applied = apply_migrations(conn)
+    print(f"Schema at version {get_schema_version(conn)} ({len(applied)} migrations applied)")
+    conn.close()
@@ -0,0 +1,58 @@
+"""
+Keep CPU-bound model work off the gevent event loop
+
+gunicorn runs the app on gevent workers (gunicorn.conf.py) so open
+notification streams cost an idle greenlet instead of a request thread.
+Greenlets only switch on I/O, so a forward pass run directly in a request
+would stall every other request and stream in that worker until it
+finished. run_blocking() hands such calls to gevent's pool of native
+threads and waits cooperatively; outside gevent it just calls the function.
+"""
+
+import sys
+
+
+def gevent_active():
+    """True when this process has been monkey-patched by gevent"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def run_blocking(fn, *args, **kwargs):
+    """Call fn(*args, **kwargs) on a native thread under gevent, directly otherwise"""
+    if not gevent_active():
+        return fn(*args, **kwargs)
+    import gevent
+    import greenlet
+    # The main greenlet (the gunicorn master loading models before fork,
+    # CLI commands) has nothing else to keep responsive, and a master must
+    # not start threads before forking
+    if greenlet.getcurrent().parent is None:
+        return fn(*args, **kwargs)
+    return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+
+
+class OffloadedModel:
+    """
+    Proxy for a loaded model whose inference methods run through run_blocking()
+
+    Every other attribute (cache, model_version, stats(), ...) is read from
+    the wrapped model unchanged.
+    """
+
+    def __init__(self, model, methods):
+        """
+        Args:
+            model: EmotionAnalyzer, LatencyBudgetedPredictor, ...
+            methods: names of the CPU-bound methods to offload
+        """
+        self._wrapped = model
+        self._methods = frozenset(methods)
+
+    def __getattr__(self, name):
+        value = getattr(self._wrapped, name)
+        if name in self._methods:
+            def offloaded(*args, **kwargs):
+                return run_blocking(value, *args, **kwargs)
+            return offloaded
+        return value
@@ -0,0 +1,141 @@
+"""
+In-process publish/subscribe hub for pushing notification updates to
+Server-Sent Events streams
+
+Each open stream subscribes with its (user_id, user_type) and blocks on a
+one-slot queue. Routes that create or change notifications publish to the
+hub, which wakes the matching streams; repeated signals before a stream
+wakes up coalesce into one. A single watcher thread per worker picks up
+notification changes (new rows and read-state updates) made by other
+gunicorn workers so their streams wake too.
+
+Under gevent workers an open stream is an idle greenlet; on threaded
+servers it holds a request thread. Either way subscribe() refuses streams
+beyond max_streams per worker and those clients poll instead.
+"""
+
+import queue
+import threading
+import time
+
+
+class NotificationHub:
+    """
+    Thread-safe registry of notification stream subscribers
+    """
+
+    def __init__(self, connect, poll_interval=2.0, max_streams=4):
+        """
+        Args:
+            connect: callable returning a new database connection, used by
+                     the cross-worker watcher thread
+            poll_interval: seconds between watcher checks for changes
+            max_streams: open streams allowed in this worker
+        """
+        self._connect = connect
+        self.poll_interval = poll_interval
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._watcher = None
+
+    def subscribe(self, user_id, user_type):
+        """
+        Register a stream for a user
+
+        Returns:
+            queue.Queue: receives a signal whenever the user's notifications
+                         change, or None if max_streams are already open
+        """
+        signal = queue.Queue(maxsize=1)
+        with self._lock:
+            if sum(len(streams) for streams in self._subscribers.values()) >= self.max_streams:
+                return None
+            self._subscribers.setdefault((user_id, user_type), set()).add(signal)
+            self._ensure_watcher()
+        return signal
+
+    def unsubscribe(self, user_id, user_type, signal):
+        """Remove a stream registered with subscribe()"""
+        with self._lock:
+            streams = self._subscribers.get((user_id, user_type))
+            if streams:
+                streams.discard(signal)
+                if not streams:
+                    del self._subscribers[(user_id, user_type)]
+
+    def subscriber_count(self):
+        """Number of open streams in this worker"""
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+    def publish(self, user_id, user_type):
+        """Wake every stream open for one user"""
+        with self._lock:
+            streams = list(self._subscribers.get((user_id, user_type), ()))
+        for signal in streams:
+            self._signal(signal)
+
+    def publish_role(self, user_type):
+        """Wake every stream open for any user of a type (e.g. all counselors)"""
+        with self._lock:
+            streams = [
+                signal
+                for (_, subscriber_type), subscribed in self._subscribers.items()
+                if subscriber_type == user_type
+                for signal in subscribed
+            ]
+        for signal in streams:
+            self._signal(signal)
+
+    @staticmethod
+    def _signal(signal):
+        try:
+            signal.put_nowait(True)
+        except queue.Full:
+            # A wake-up is already pending for this stream
+            pass
+
+    def _ensure_watcher(self):
+        """Start the cross-worker watcher thread (caller holds the lock)"""
+        if self._watcher is None or not self._watcher.is_alive():
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        """
+        Wake streams for notification changes made by other processes
+
+        Triggers give every inserted, updated or deleted notification's user
+        the next notification_versions value (migration 8), so one indexed
+        query per poll_interval finds all changed users while any stream is
+        open in this worker, independent of how many tabs are connected.
+        """
+        last_version = None
+        while True:
+            if not self.subscriber_count():
+                last_version = None
+                time.sleep(self.poll_interval)
+                continue
+
+            try:
+                conn = self._connect()
+                try:
+                    if last_version is None:
+                        row = conn.execute('SELECT MAX(version) FROM notification_versions').fetchone()
+                        last_version = row[0] or 0
+                    else:
+                        rows = conn.execute(
+                            'SELECT user_id, user_type, version FROM notification_versions '
+                            'WHERE version > ? ORDER BY version',
+                            (last_version,)
+                        ).fetchall()
+                        for row in rows:
+                            self.publish(row[0], row[1])
+                            last_version = row[2]
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Notification watcher error: {e}")
+
+            time.sleep(self.poll_interval)
@@ -1,14 +1,22 @@
 // Dashboard JavaScript for Counselor Interface
 
-document.addEventListener('DOMContentLoaded', function() {
-    // Track which students have been loaded
-    const loadedStudents = new Set();
+// Track which students have had their details loaded
+const loadedStudents = new Set();
+
+// Keyset pagination state for the student list
+let studentCursor = null;
+let studentRequestId = 0;
 
-    // Listen for accordion expansion
-    const accordionButtons = document.querySelectorAll('.accordion-button');
-    accordionButtons.forEach(button => {
-        button.addEventListener('click', function() {
-            const studentId = this.getAttribute('data-student-id');
+document.addEventListener('DOMContentLoaded', function() {
+    const accordion = document.getElementById('studentsAccordion');
+    
+    // Listen for accordion expansion (rows are added as pages load)
+    if (accordion) {
+        accordion.addEventListener('click', function(event) {
+            const button = event.target.closest('.accordion-button');
+            if (!button) return;
+            
+            const studentId = button.getAttribute('data-student-id');
             
             // Only load once
             if (!loadedStudents.has(studentId)) {
@@ -16,14 +24,193 @@ document.addEventListener('DOMContentLoaded', function() {
                 loadedStudents.add(studentId);
             }
         });
+        
+        // Re-query from the first page whenever a filter changes
+        const filters = document.getElementById('studentFilters');
+        let searchTimer = null;
+        filters.addEventListener('change', () => loadStudentPage(true));
+        filters.addEventListener('input', function(event) {
+            if (event.target.name !== 'q') return;
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => loadStudentPage(true), 300);
+        });
+        filters.addEventListener('submit', event => event.preventDefault());
+        
+        loadStudentPage(true);
+    }
+    
+    // Notifications are streamed by the base template
+});
+
+function loadStudentPage(reset = false) {
+    const accordion = document.getElementById('studentsAccordion');
+    const loadingEl = document.getElementById('studentsLoading');
+    const emptyEl = document.getElementById('studentsEmpty');
+    const moreBtn = document.getElementById('loadMoreStudents');
+    
+    if (reset) {
+        studentCursor = null;
+        accordion.innerHTML = '';
+        loadedStudents.clear();
+    }
+    
+    const params = new URLSearchParams();
+    new FormData(document.getElementById('studentFilters')).forEach((value, key) => {
+        if (value) params.append(key, value);
     });
+    if (studentCursor) params.append('cursor', studentCursor);
     
-    // Load notifications
-    loadNotifications();
+    // Ignore responses to requests superseded by a newer filter change
+    const requestId = ++studentRequestId;
+    loadingEl.style.display = 'block';
+    emptyEl.style.display = 'none';
+    moreBtn.style.display = 'none';
     
-    // Refresh notifications every 30 seconds
-    setInterval(loadNotifications, 30000);
-});
+    fetch(`/counselor/students?${params.toString()}`)
+        .then(response => response.json())
+        .then(data => {
+            if (requestId !== studentRequestId) return;
+            loadingEl.style.display = 'none';
+            
+            if (!data.success) {
+                accordion.insertAdjacentHTML('beforeend',
+                    `<div class="alert alert-danger m-3">${escapeHtml(data.message)}</div>`);
+                return;
+            }
+            
+            data.students.forEach(student => {
+                accordion.insertAdjacentHTML('beforeend', renderStudentItem(student));
+            });
+            
+            studentCursor = data.next_cursor;
+            moreBtn.style.display = studentCursor ? 'inline-block' : 'none';
+            emptyEl.style.display = accordion.children.length === 0 ? 'block' : 'none';
+        })
+        .catch(error => {
+            if (requestId !== studentRequestId) return;
+            console.error('Error loading students:', error);
+            loadingEl.innerHTML = '<div class="alert alert-danger">Failed to load students</div>';
+        });
+}
+
+function escapeHtml(value) {
+    return String(value ?? '')
+        .replace(/&/g, '&amp;')
+        .replace(/</g, '&lt;')
+        .replace(/>/g, '&gt;')
+        .replace(/"/g, '&quot;')
+        .replace(/'/g, '&#39;');
+}
+
+function renderStudentItem(student) {
+    const borderClass = student.risk_level === 'high' ? 'border-danger'
+        : student.risk_level === 'moderate' ? 'border-warning' : 'border-success';
+    const badgeClass = student.risk_level === 'high' ? 'bg-danger'
+        : student.risk_level === 'moderate' ? 'bg-warning text-dark' : 'bg-success';
+    
+    const factors = Object.entries(student.factors).map(([key, value]) => {
+        const factorClass = value.includes('Critical') ? 'bg-danger'
+            : value.includes('Concerning') ? 'bg-warning text-dark' : 'bg-info';
+        const label = key.replace(/_/g, ' ').replace(/\b\w/g, c => c.toUpperCase());
+        return `
+            <li>
+                <span class="badge ${factorClass} me-1">${escapeHtml(label)}</span>
+                ${escapeHtml(value)}
+            </li>`;
+    }).join('');
+    
+    const meetingButton = student.risk_level === 'high' ? `
+        <button class="btn btn-danger btn-sm"
+                data-student-name="${escapeHtml(student.name)}"
+                onclick="scheduleMeetingWithStudent(${student.id}, this.dataset.studentName)">
+            <i class="bi bi-calendar-plus"></i> Schedule Meeting
+        </button>` : '';
+    
+    return `
+        <div class="accordion-item border-start border-5 ${borderClass}">
+            <h2 class="accordion-header">
+                <button class="accordion-button collapsed" type="button"
+                        data-bs-toggle="collapse"
+                        data-bs-target="#student${student.id}"
+                        data-student-id="${student.id}">
+                    <div class="w-100 d-flex justify-content-between align-items-center pe-3">
+                        <div>
+                            <strong>${escapeHtml(student.name)}</strong>
+                            <br>
+                            <small class="text-muted">
+                                ${escapeHtml(student.roll_number)} | ${escapeHtml(student.department)} |
+                                Semester ${escapeHtml(student.semester)}
+                            </small>
+                        </div>
+                        <div class="text-end">
+                            <span class="badge ${badgeClass} me-2">${student.risk_level.toUpperCase()}</span>
+                            <span class="badge bg-secondary">CGPA: ${escapeHtml(student.cgpa)}</span>
+                        </div>
+                    </div>
+                </button>
+            </h2>
+            <div id="student${student.id}"
+                 class="accordion-collapse collapse"
+                 data-bs-parent="#studentsAccordion">
+                <div class="accordion-body">
+                    <div class="row mb-3">
+                        <div class="col-md-6">
+                            <h6 class="text-primary"><i class="bi bi-person-badge"></i> Student Info</h6>
+                            <ul class="list-unstyled small">
+                                <li><strong>Email:</strong> ${escapeHtml(student.email)}</li>
+                                <li><strong>Department:</strong> ${escapeHtml(student.department)}</li>
+                                <li><strong>Semester:</strong> ${escapeHtml(student.semester)}</li>
+                                <li><strong>CGPA:</strong> ${escapeHtml(student.cgpa)}</li>
+                            </ul>
+                            ${meetingButton}
+                        </div>
+                        <div class="col-md-6">
+                            <h6 class="text-danger"><i class="bi bi-exclamation-triangle"></i> Risk Factors</h6>
+                            <ul class="list-unstyled small">${factors}</ul>
+                        </div>
+                    </div>
+                    
+                    <!-- Loading indicator for details -->
+                    <div class="student-details-loading text-center py-3" id="loading${student.id}">
+                        <div class="spinner-border text-primary" role="status">
+                            <span class="visually-hidden">Loading...</span>
+                        </div>
+                    </div>
+                    
+                    <!-- Details container -->
+                    <div class="student-details" id="details${student.id}" style="display: none;">
+                        <h6 class="text-info"><i class="bi bi-graph-up"></i> Weekly Trends</h6>
+                        <div class="row">
+                            <div class="col-md-4">
+                                <div class="card bg-light border-0 mb-3">
+                                    <div class="card-body p-3">
+                                        <h6 class="small mb-2">Mood Trend</h6>
+                                        <canvas id="moodChart${student.id}"></canvas>
+                                    </div>
+                                </div>
+                            </div>
+                            <div class="col-md-4">
+                                <div class="card bg-light border-0 mb-3">
+                                    <div class="card-body p-3">
+                                        <h6 class="small mb-2">Sleep Hours</h6>
+                                        <div id="sleepData${student.id}"></div>
+                                    </div>
+                                </div>
+                            </div>
+                            <div class="col-md-4">
+                                <div class="card bg-light border-0 mb-3">
+                                    <div class="card-body p-3">
+                                        <h6 class="small mb-2">Attendance</h6>
+                                        <div id="attendanceData${student.id}"></div>
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        </div>`;
+}
 
 function loadStudentDetails(studentId) {
     const loadingEl = document.getElementById(`loading${studentId}`);
@@ -168,47 +355,17 @@ function renderAttendanceData(studentId, attendance) {
     `;
 }
 
-// Search functionality (if needed)
-function searchStudents() {
-    const input = document.getElementById('studentSearch');
-    if (!input) return;
-    
-    const filter = input.value.toUpperCase();
-    const accordion = document.getElementById('studentsAccordion');
-    const items = accordion.getElementsByClassName('accordion-item');
-    
-    for (let i = 0; i < items.length; i++) {
-        const button = items[i].getElementsByClassName('accordion-button')[0];
-        const txtValue = button.textContent || button.innerText;
-        if (txtValue.toUpperCase().indexOf(filter) > -1) {
-            items[i].style.display = '';
-        } else {
-            items[i].style.display = 'none';
-        }
-    }
-}
-
 // Export student list
 function exportStudentList() {
-    // Get all student data
-    const students = [];
-    const items = document.querySelectorAll('.accordion-item');
-    
-    items.forEach(item => {
-        const button = item.querySelector('.accordion-button');
-        const text = button.textContent.trim();
-        students.push(text);
+    // The server writes every matching student, not just the pages loaded so far
+    const params = new URLSearchParams();
+    new FormData(document.getElementById('studentFilters')).forEach((value, key) => {
+        if (value) params.append(key, value);
     });
-    
-    // Create CSV
-    const csv = students.join('\n');
-    const blob = new Blob([csv], { type: 'text/csv' });
-    const url = window.URL.createObjectURL(blob);
     const a = document.createElement('a');
-    a.href = url;
+    a.href = `/counselor/students.csv?${params.toString()}`;
     a.download = 'student_risk_report.csv';
     a.click();
-    window.URL.revokeObjectURL(url);
 }
 
 // Notification functions
@@ -331,22 +488,6 @@ function toggleNotifications() {
     }
 }
 
-function markNotificationRead(notificationId) {
-    fetch(`/mark_notification_read/${notificationId}`, {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        }
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            loadNotifications();
-        }
-    })
-    .catch(error => console.error('Error marking notification as read:', error));
-}
-
 function formatDate(dateString) {
     const date = new Date(dateString);
     const now = new Date();